@@ -1,4 +1,7 @@
+import logging
+
 from anadeabot.app import App
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     App().run()
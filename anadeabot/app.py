@@ -1,11 +1,24 @@
 import os
+import asyncio
+from contextlib import ExitStack
 
 from pyrogram import Client
 
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+from anadeabot import database
+from anadeabot import index
+from anadeabot import metrics
+from anadeabot import maintenance
+from anadeabot.dispatcher import dispatcher
 from anadeabot.settings import settings
+from anadeabot.runtime import Runtime
+from anadeabot.serde import CompactSerializer, MetadataSerializer
 
 
 class App(Client):
+    runtime: Runtime
+
     def __init__(self):
         super().__init__(
             name='TeeCustomizer',
@@ -14,3 +27,33 @@ class App(Client):
             bot_token=settings.BOT_TOKEN,
             plugins={'root': os.path.basename(os.path.dirname(__file__))}
         )
+        self.resources = ExitStack()
+
+    async def start(self, *args, **kwargs):
+        await database.pool.open()
+        serde = CompactSerializer(index.document, threshold=settings.checkpoint_compress_threshold)
+        checkpointer = AsyncPostgresSaver(database.pool, serde=serde)
+        checkpointer.jsonplus_serde = MetadataSerializer()
+        self.runtime = Runtime(checkpointer)
+        await self.runtime.open()
+        dispatcher.start()
+        reporter = asyncio.create_task(metrics.report(settings.metrics_interval))
+        self.resources.callback(reporter.cancel)
+        if settings.vector_index or settings.answer_cache:
+            watcher = asyncio.create_task(index.watch(settings.index_refresh_interval))
+            self.resources.callback(watcher.cancel)
+        if settings.checkpoint_prune_interval:
+            pruner = asyncio.create_task(maintenance.prune_periodically(
+                settings.checkpoint_prune_interval, settings.checkpoint_keep, settings.checkpoint_prune_batch,
+                settings.embedding_cache_ttl
+            ))
+            self.resources.callback(pruner.cancel)
+        return await super().start(*args, **kwargs)
+
+    async def stop(self, *args, **kwargs):
+        try:
+            await dispatcher.stop()
+            return await super().stop(*args, **kwargs)
+        finally:
+            self.resources.close()
+            await database.pool.close()
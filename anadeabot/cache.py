@@ -0,0 +1,385 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Sequence
+from datetime import timedelta
+from typing import Any
+
+import sqlalchemy as sa
+from langchain_core.caches import BaseCache
+from langchain_core.embeddings import Embeddings
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import ChatGeneration, Generation
+from langchain_core.runnables.config import var_child_runnable_config
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from anadeabot.models import Embedding, Answer, CachedGeneration
+
+
+class LRUCache:
+    """A bounded thread-safe mapping that evicts the least recently used entries."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+def text_hash(text: str) -> bytes:
+    """Hashes a text with case and whitespace normalized, so trivially different spellings share a key."""
+    return hashlib.sha256(' '.join(text.casefold().split()).encode()).digest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings looked up in memory, then in Postgres, and only then requested from the model.
+
+    Vectors are keyed by the model, dimensionality and normalized text hash. The table is
+    shared by all processes and survives restarts. Postgres errors only disable the
+    persistent tier for a call, they never fail it.
+    """
+
+    def __init__(self, embeddings: Embeddings, sessions: async_sessionmaker[AsyncSession], model: str,
+                 dimensionality: int, maxsize: int):
+        self.embeddings = embeddings
+        self.sessions = sessions
+        self.model = model
+        self.dimensionality = dimensionality
+        self.memory = LRUCache(maxsize)
+        self.stored_hits = 0
+        self.misses = 0
+
+    async def load(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        statement = sa.select(Embedding.text_hash, Embedding.vector).where(
+            Embedding.model == self.model,
+            Embedding.dimensionality == self.dimensionality,
+            Embedding.text_hash.in_(keys),
+        )
+        try:
+            async with self.sessions.begin() as session:
+                rows = (await session.execute(statement)).all()
+        except SQLAlchemyError as exc:
+            logging.warning('Embedding cache lookup failed: %s', exc)
+            return {}
+        return {key: [float(x) for x in vector] for key, vector in rows}
+
+    async def save(self, vectors: dict[bytes, list[float]]) -> None:
+        statement = postgresql.insert(Embedding).values([
+            {'model': self.model, 'dimensionality': self.dimensionality, 'text_hash': key, 'vector': vector}
+            for key, vector in vectors.items()
+        ]).on_conflict_do_nothing()
+        try:
+            async with self.sessions.begin() as session:
+                await session.execute(statement)
+        except SQLAlchemyError as exc:
+            logging.warning('Embedding cache update failed: %s', exc)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [text_hash(text) for text in texts]
+        vectors = self.recall(keys)
+        if absent := [key for key in dict.fromkeys(keys) if key not in vectors]:
+            stored = await self.load(absent)
+            self.stored_hits += len(stored)
+            vectors.update(stored)
+            if missing := [key for key in absent if key not in stored]:
+                self.misses += len(missing)
+                texts_by_key = dict(zip(keys, texts))
+                computed = await self.embeddings.aembed_documents([texts_by_key[key] for key in missing])
+                computed = dict(zip(missing, computed))
+                await self.save(computed)
+                vectors.update(computed)
+            for key in absent:
+                self.memory.set(key, vectors[key])
+        return [vectors[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        # Synchronous callers only get the in-memory tier, Postgres is accessed asynchronously,
+        # and their requests are not governed. Nothing in the bot embeds synchronously.
+        keys = [text_hash(text) for text in texts]
+        vectors = self.recall(keys)
+        if absent := {key: text for key, text in zip(keys, texts) if key not in vectors}:
+            self.misses += len(absent)
+            for key, vector in zip(absent, self.embeddings.embed_documents(list(absent.values()))):
+                self.memory.set(key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    def recall(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        vectors = {}
+        for key in dict.fromkeys(keys):
+            if (vector := self.memory.get(key)) is not None:
+                vectors[key] = vector
+        return vectors
+
+    def stats(self) -> dict[str, int]:
+        memory = self.memory.stats()
+        return {
+            'size': memory['size'],
+            'memory_hits': memory['hits'],
+            'stored_hits': self.stored_hits,
+            'misses': self.misses,
+        }
+
+
+class AnswerCache:
+    """Final answers to FAQ questions, looked up by similarity of refined question embeddings.
+
+    Every answer is stored with the signature of the knowledge it is based on. Answers to
+    other knowledge never match, and they are deleted once the signature changes. Nothing
+    is cached while the signature is unknown. Expired answers never match either, they are
+    deleted by the maintenance job.
+    """
+
+    def __init__(self, sessions: async_sessionmaker[AsyncSession], knowledge: Callable[[], str | None],
+                 threshold: float, ttl: float):
+        self.sessions = sessions
+        self.knowledge = knowledge
+        self.threshold = threshold
+        self.ttl = timedelta(seconds=ttl)
+        self.signature: str | None = None
+        self.hits = 0
+        self.misses = 0
+        # Time spent on generation a hit skips, for questions that were not in the cache.
+        self.spent = 0.0
+
+    async def lookup(self, vector: list[float]) -> str | None:
+        if (signature := self.knowledge()) is None:
+            return None
+        distance = Answer.vector.cosine_distance(vector)
+        statement = (sa.select(Answer.answer)
+                     .where(Answer.knowledge == signature,
+                            Answer.created_at > sa.func.localtimestamp() - self.ttl,
+                            distance <= 1 - self.threshold)
+                     .order_by(distance)
+                     .limit(1))
+        try:
+            if signature != self.signature:
+                await self.purge(signature)
+            async with self.sessions.begin() as session:
+                answer = await session.scalar(statement)
+        except SQLAlchemyError as exc:
+            logging.warning('Answer cache lookup failed: %s', exc)
+            answer = None
+        if answer is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return answer
+
+    async def store(self, question: str, vector: list[float], answer: str) -> None:
+        if (signature := self.knowledge()) is None:
+            return
+        try:
+            async with self.sessions.begin() as session:
+                session.add(Answer(question=question, vector=vector, answer=answer, knowledge=signature))
+        except SQLAlchemyError as exc:
+            logging.warning('Answer cache update failed: %s', exc)
+
+    async def purge(self, signature: str | None = None) -> int:
+        """Deletes answers older than the TTL, and answers to outdated knowledge if the signature is known."""
+        condition = Answer.created_at <= sa.func.localtimestamp() - self.ttl
+        if signature is not None:
+            condition |= Answer.knowledge != signature
+        async with self.sessions.begin() as session:
+            deleted = await session.execute(sa.delete(Answer).where(condition))
+        if signature is not None:
+            self.signature = signature
+        return deleted.rowcount
+
+    def record(self, seconds: float) -> None:
+        self.spent += seconds
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        avg_miss = self.spent / self.misses if self.misses else 0.0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 2) if lookups else 0,
+            'avg_miss_ms': round(avg_miss * 1000),
+            'saved_ms': round(self.hits * avg_miss * 1000),
+        }
+
+
+def current_node() -> str | None:
+    """Name of the graph node the running call belongs to, as set by LangGraph in run metadata."""
+    config = var_child_runnable_config.get() or {}
+    return config.get('metadata', {}).get('langgraph_node')
+
+
+def fresh(generations: Sequence[Generation]) -> list[Generation]:
+    # A message replayed from the cache must not reuse the id it had in another conversation.
+    return [
+        generation.copy(update={'message': generation.message.copy(update={'id': None})})
+        if isinstance(generation, ChatGeneration) else generation
+        for generation in generations
+    ]
+
+
+class NodeLLMCache(BaseCache):
+    """Exact-match cache of model responses, enabled per graph node.
+
+    A key hashes the prompt with the model string, which holds the model name, its
+    parameters and bound tools or output schema. Only calls from nodes of the policy are
+    cached, each node with its own TTL in seconds.
+    """
+
+    def __init__(self, policy: dict[str, float]):
+        self.policy = policy
+        self.hits = dict.fromkeys(policy, 0)
+        self.misses = dict.fromkeys(policy, 0)
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> bytes:
+        return hashlib.sha256(f'{llm_string}\0{prompt}'.encode()).digest()
+
+    def scope(self) -> str | None:
+        node = current_node()
+        return node if node in self.policy else None
+
+    def count(self, node: str, generations: Sequence[Generation] | None) -> list[Generation] | None:
+        if generations is None:
+            self.misses[node] += 1
+            return None
+        self.hits[node] += 1
+        return fresh(generations)
+
+    def get(self, key: bytes) -> Sequence[Generation] | None:
+        return None
+
+    def set(self, key: bytes, node: str, generations: Sequence[Generation]) -> None:
+        pass
+
+    async def aget(self, key: bytes) -> Sequence[Generation] | None:
+        return self.get(key)
+
+    async def aset(self, key: bytes, node: str, generations: Sequence[Generation]) -> None:
+        self.set(key, node, generations)
+
+    def lookup(self, prompt: str, llm_string: str) -> list[Generation] | None:
+        if (node := self.scope()) is None:
+            return None
+        return self.count(node, self.get(self.key(prompt, llm_string)))
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        if (node := self.scope()) is not None:
+            self.set(self.key(prompt, llm_string), node, fresh(return_val))
+
+    async def alookup(self, prompt: str, llm_string: str) -> list[Generation] | None:
+        if (node := self.scope()) is None:
+            return None
+        return self.count(node, await self.aget(self.key(prompt, llm_string)))
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        if (node := self.scope()) is not None:
+            await self.aset(self.key(prompt, llm_string), node, fresh(return_val))
+
+    def stats(self) -> dict[str, int | float]:
+        stats = {}
+        for node in self.policy:
+            lookups = self.hits[node] + self.misses[node]
+            stats[f'{node}_hits'] = self.hits[node]
+            stats[f'{node}_hit_rate'] = round(self.hits[node] / lookups, 2) if lookups else 0
+        return stats
+
+
+class MemoryLLMCache(NodeLLMCache):
+    """Responses kept in a process-local LRU."""
+
+    def __init__(self, policy: dict[str, float], maxsize: int):
+        super().__init__(policy)
+        self.memory = LRUCache(maxsize)
+
+    def get(self, key: bytes) -> Sequence[Generation] | None:
+        expires, generations = self.memory.get(key, (0.0, None))
+        return generations if expires > time.monotonic() else None
+
+    def set(self, key: bytes, node: str, generations: Sequence[Generation]) -> None:
+        self.memory.set(key, (time.monotonic() + self.policy[node], generations))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.memory.clear()
+
+
+class PostgresLLMCache(NodeLLMCache):
+    """Responses kept in the generation table, shared by all processes.
+
+    The table is only accessed asynchronously, synchronous calls are not cached.
+    """
+
+    def __init__(self, policy: dict[str, float], sessions: async_sessionmaker[AsyncSession]):
+        super().__init__(policy)
+        self.sessions = sessions
+
+    async def aget(self, key: bytes) -> Sequence[Generation] | None:
+        statement = sa.select(CachedGeneration.value).where(
+            CachedGeneration.key == key, CachedGeneration.expires_at > sa.func.localtimestamp()
+        )
+        try:
+            async with self.sessions.begin() as session:
+                value = await session.scalar(statement)
+        except SQLAlchemyError as exc:
+            logging.warning('LLM cache lookup failed: %s', exc)
+            return None
+        return loads(value) if value is not None else None
+
+    async def aset(self, key: bytes, node: str, generations: Sequence[Generation]) -> None:
+        statement = postgresql.insert(CachedGeneration).values(
+            key=key, node=node, value=dumps(list(generations)),
+            expires_at=sa.func.localtimestamp() + timedelta(seconds=self.policy[node])
+        )
+        statement = statement.on_conflict_do_update(index_elements=['gen_key'], set_={
+            'gen_node': statement.excluded.gen_node,
+            'gen_value': statement.excluded.gen_value,
+            'gen_expires_at': statement.excluded.gen_expires_at,
+        })
+        try:
+            async with self.sessions.begin() as session:
+                await session.execute(statement)
+        except SQLAlchemyError as exc:
+            logging.warning('LLM cache update failed: %s', exc)
+
+    def clear(self, **kwargs: Any) -> None:
+        pass
+
+    async def aclear(self, **kwargs: Any) -> None:
+        async with self.sessions.begin() as session:
+            await session.execute(sa.delete(CachedGeneration))
@@ -0,0 +1,57 @@
+"""Maintenance commands, run against the configured database.
+
+    python -m anadeabot.cli prune-checkpoints [--keep N] [--batch N]
+    python -m anadeabot.cli sync-knowledge [--path data/qa.csv] [--batch N] [--concurrency N]
+"""
+import asyncio
+import logging
+import argparse
+
+from langchain_openai import ChatOpenAI
+
+from anadeabot import database
+from anadeabot import knowledge
+from anadeabot import maintenance
+from anadeabot.governor import http_client
+from anadeabot.settings import settings
+
+
+async def prune_checkpoints(args: argparse.Namespace) -> None:
+    async with database.pool:
+        result = await maintenance.prune_checkpoints(keep=args.keep, batch=args.batch)
+    print(', '.join(f'{key}={value}' for key, value in result.items()))
+
+
+async def sync_knowledge(args: argparse.Namespace) -> None:
+    llm = ChatOpenAI(model=settings.model, api_key=settings.OPENAI_API_KEY, http_async_client=http_client())
+    async with database.pool:
+        result = await knowledge.sync(args.path, llm, batch=args.batch, concurrency=args.concurrency)
+    print(', '.join(f'{key}={value}' for key, value in result.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m anadeabot.cli')
+    commands = parser.add_subparsers(required=True)
+
+    prune = commands.add_parser('prune-checkpoints', help='delete old checkpoints with their writes and blobs')
+    prune.add_argument('--keep', type=int, default=settings.checkpoint_keep,
+                       help='checkpoints to keep per thread')
+    prune.add_argument('--batch', type=int, default=settings.checkpoint_prune_batch,
+                       help='threads to process per transaction')
+    prune.set_defaults(command=prune_checkpoints)
+
+    sync = commands.add_parser('sync-knowledge', help='update FAQ and grounding facts from a CSV file')
+    sync.add_argument('--path', default='data/qa.csv', help='CSV file with question and answer columns')
+    sync.add_argument('--batch', type=int, default=settings.sync_batch_size,
+                      help='rows to embed and generate facts for at once')
+    sync.add_argument('--concurrency', type=int, default=settings.sync_concurrency,
+                      help='concurrent fact generation requests')
+    sync.set_defaults(command=sync_knowledge)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(args.command(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,75 +1,187 @@
+import re
+import uuid
 from typing import TypedDict
 
 from langchain_core.documents import Document
 from langchain_openai.embeddings import OpenAIEmbeddings
 from langchain_postgres import PGVector
 
-import sqlalchemy as sa
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
 
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql.psycopg import _log_notices
+from sqlalchemy.util import await_only
+
+from anadeabot.cache import LRUCache, CachedEmbeddings, NodeLLMCache, MemoryLLMCache, PostgresLLMCache
+from anadeabot.governor import http_client
 from anadeabot.settings import settings
 from anadeabot.schemas import DesignChoice
 from anadeabot.models import User, Order, Request
 
-engine = create_engine(
+
+async def _configure_connection(connection: AsyncConnection) -> None:
+    # Checkpointer expects autocommit connections with dict rows, SQLAlchemy handles
+    # transactions on its own and expects tuples, so connections are switched on checkout.
+    await connection.set_autocommit(True)
+    connection.row_factory = dict_row
+
+
+pool = AsyncConnectionPool(
     settings.POSTGRES_URI,
-    pool_size=20,
-    max_overflow=10,
-    pool_pre_ping=True,
-    pool_use_lifo=True,
-    connect_args={
+    min_size=settings.pool_min_size,
+    max_size=settings.pool_max_size,
+    timeout=settings.pool_timeout,
+    max_idle=settings.pool_max_idle,
+    kwargs={
+        "autocommit": True,
+        "prepare_threshold": 0,
+        "row_factory": dict_row,
         "connect_timeout": 10,
         "tcp_user_timeout": 10_000,
         "keepalives": 1,
         "keepalives_idle": 5,
         "keepalives_count": 5,
         "keepalives_interval": 1,
-    }
+        "options": f"-c hnsw.ef_search={settings.hnsw_ef_search}",
+    },
+    reset=_configure_connection,
+    check=AsyncConnectionPool.check_connection,
+    name='anadeabot',
+    open=False,
 )
 
-embeddings = OpenAIEmbeddings(
+
+class SharedPool(NullPool):
+    """SQLAlchemy pool that borrows connections from the shared psycopg pool."""
+
+    def _close_connection(self, connection, *, terminate: bool = False) -> None:
+        # The dialect adds its notice handler on every checkout, as it takes each one for a
+        # new connection, so the handler is removed before the connection goes back.
+        try:
+            connection.driver_connection.remove_notice_handler(_log_notices)
+        except ValueError:
+            pass
+        # Runs inside SQLAlchemy's greenlet bridge, so the async pool can be awaited.
+        if terminate:
+            connection.close()
+        await_only(pool.putconn(connection.driver_connection))
+
+
+async def _checkout() -> AsyncConnection:
+    connection = await pool.getconn()
+    await connection.set_autocommit(False)
+    connection.row_factory = tuple_row
+    return connection
+
+
+engine = create_async_engine('postgresql+psycopg://', async_creator=_checkout, poolclass=SharedPool)
+
+sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+
+def pool_stats() -> dict[str, int]:
+    stats = pool.get_stats()
+    return {
+        'size': stats['pool_size'],
+        'checked_out': stats['pool_size'] - stats['pool_available'],
+        'waiting': stats['requests_waiting'],
+        'requests': stats.get('requests_num', 0),
+        'wait_ms': stats.get('requests_wait_ms', 0),
+        'errors': stats.get('requests_errors', 0),
+    }
+
+
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(
+        model=settings.embedding_model,
+        api_key=settings.OPENAI_API_KEY,
+        dimensions=settings.dimensionality,
+        http_async_client=http_client(),
+    ),
+    sessions,
     model=settings.embedding_model,
-    api_key=settings.OPENAI_API_KEY,
-    dimensions=settings.dimensionality
+    dimensionality=settings.dimensionality,
+    maxsize=settings.embedding_cache_size,
 )
 
 faq_vectorstore = PGVector(
     embeddings=embeddings,
-    connection=settings.POSTGRES_URI,
+    connection=engine,
     embedding_length=settings.dimensionality,
     collection_name='faq',
     use_jsonb=True,
+    async_mode=True,
 )
 
 grounding_vectorstore = PGVector(
     embeddings=embeddings,
-    connection=settings.POSTGRES_URI,
+    connection=engine,
     embedding_length=settings.dimensionality,
     collection_name='grounding',
     use_jsonb=True,
+    async_mode=True,
 )
 
 
-def create_user(telegram_id: str | int, *, session: Session) -> User:
-    user = User(telegram_id=telegram_id)
-    session.add(user)
-    session.flush()
-    return user
+async def prepare_vectorstores() -> None:
+    """Creates the extension, tables and collections of the vector stores if they are missing.
+
+    In async mode PGVector defines its ORM classes only on its first call, while the index
+    and the knowledge sync query its tables directly, so this has to run before them.
+    """
+    for vectorstore in [faq_vectorstore, grounding_vectorstore]:
+        await vectorstore.acreate_collection()
+
+
+users = LRUCache(settings.user_cache_size)
+
+llm_cache: NodeLLMCache | None = None
+if settings.llm_cache == 'memory':
+    llm_cache = MemoryLLMCache(settings.llm_cache_nodes, maxsize=settings.llm_cache_size)
+elif settings.llm_cache == 'postgres':
+    llm_cache = PostgresLLMCache(settings.llm_cache_nodes, sessions)
+
+
+def vector_index_ddl(collection_name: str, collection_id: uuid.UUID | str,
+                     table: str = 'langchain_pg_embedding') -> tuple[str, str]:
+    """Statements creating and dropping an HNSW cosine index over the rows of one collection."""
+    name = re.sub(r'\W', '_', f'ix_{table}_{collection_name}_hnsw')
+    create = (f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING hnsw (embedding vector_cosine_ops) '
+              f'WITH (m = {settings.hnsw_m}, ef_construction = {settings.hnsw_ef_construction}) '
+              f"WHERE collection_id = '{collection_id}'")
+    return create, f'DROP INDEX IF EXISTS {name}'
+
+
+async def get_or_create_user(telegram_id: str | int, *, session: AsyncSession) -> uuid.UUID:
+    statement = postgresql.insert(User).values(telegram_id=str(telegram_id))
+    statement = statement.on_conflict_do_update(
+        index_elements=['user_telegram_id'],
+        set_={'user_telegram_id': statement.excluded.user_telegram_id}
+    ).returning(User.id)
+    return await session.scalar(statement)
 
 
-def get_user(telegram_id: str | int, *, session: Session) -> User | None:
-    return session.scalar(sa.select(User).filter_by(telegram_id=str(telegram_id)))
+async def resolve_user(telegram_id: str | int) -> uuid.UUID:
+    if (user_id := users.get(str(telegram_id))) is None:
+        async with sessions.begin() as session:
+            user_id = await get_or_create_user(telegram_id, session=session)
+        users.set(str(telegram_id), user_id)
+    return user_id
 
 
-def delete_user(user: User, *, session: Session) -> None:
-    session.delete(user)
-    session.flush()
+async def delete_user(telegram_id: str | int, *, session: AsyncSession) -> None:
+    users.pop(str(telegram_id))
+    await session.execute(sa.delete(User).filter_by(telegram_id=str(telegram_id)))
 
 
-def place_order(user: User, design: DesignChoice, *, session: Session) -> Order:
+async def place_order(user_id: uuid.UUID, design: DesignChoice, *, session: AsyncSession) -> Order:
     order = Order(
-        user_id=user.id,
+        user_id=user_id,
         color=design.color,
         size=design.size,
         style=design.style,
@@ -77,14 +189,14 @@ def place_order(user: User, design: DesignChoice, *, session: Session) -> Order:
         printing=design.printing
     )
     session.add(order)
-    session.flush()
+    await session.flush()
     return order
 
 
-def make_request(user: User, details: str, *, session: Session) -> Request:
-    request = Request(user_id=user.id, details=details)
+async def make_request(user_id: uuid.UUID, details: str, *, session: AsyncSession) -> Request:
+    request = Request(user_id=user_id, details=details)
     session.add(request)
-    session.flush()
+    await session.flush()
     return request
 
 
@@ -93,12 +205,12 @@ class FAQ(TypedDict):
     answer: str
 
 
-def create_faq(questions_and_answers: list[FAQ]) -> list[str]:
+async def create_faq(questions_and_answers: list[FAQ], ids: list[str] | None = None) -> list[str]:
     documents = [
         Document(qa['question'], metadata={'answer': qa['answer']}) for qa in questions_and_answers
     ]
-    return faq_vectorstore.add_documents(documents)
+    return await faq_vectorstore.aadd_documents(documents, ids=ids)
 
 
-def add_facts(documents: list[str]) -> list[str]:
-    return grounding_vectorstore.add_documents([Document(d) for d in documents])
+async def add_facts(documents: list[str], ids: list[str] | None = None) -> list[str]:
+    return await grounding_vectorstore.aadd_documents([Document(d) for d in documents], ids=ids)
@@ -0,0 +1,145 @@
+import time
+import asyncio
+import logging
+import functools
+from collections import deque
+from dataclasses import dataclass, field
+from collections.abc import Callable, Awaitable
+
+from pyrogram import Client
+from pyrogram.types import Message
+
+from anadeabot.settings import settings
+
+
+@dataclass
+class Job:
+    func: Callable[..., Awaitable]
+    client: Client
+    messages: list[Message]
+    coalesce: bool = False
+    arrived: float = field(default_factory=time.monotonic)
+    deadline: float = field(default_factory=time.monotonic)
+
+
+class Dispatcher:
+    """Runs jobs of a chat one at a time and in order, spreading chats across a bounded pool of workers."""
+
+    def __init__(self, workers: int, queue_size: int, chat_queue_size: int, debounce: float, debounce_max: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.chat_queue_size = chat_queue_size
+        self.debounce = debounce
+        self.debounce_max = debounce_max
+        # A chat stays here while it has queued jobs or one of its jobs is running. It is
+        # scheduled only when no worker holds it, and becomes ready once its next job is due.
+        self.chats: dict[int, deque[Job]] = {}
+        self.ready: asyncio.Queue[int] = asyncio.Queue()
+        self.tasks: list[asyncio.Task] = []
+        self.queued = 0
+        self.processed = 0
+        self.coalesced = 0
+        self.shed = 0
+        self.wait = 0.0
+        self.max_wait = 0.0
+
+    def start(self) -> None:
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, chat_id: int, job: Job) -> bool:
+        if job.coalesce:
+            job.deadline += self.debounce
+        queue = self.chats.get(chat_id)
+        if queue and self.merge(queue[-1], job):
+            return True
+        if self.queued >= self.queue_size or (queue is not None and len(queue) >= self.chat_queue_size):
+            self.shed += 1
+            return False
+        if queue is None:
+            queue = self.chats[chat_id] = deque()
+            queue.append(job)
+            self.schedule(chat_id)
+        else:
+            queue.append(job)
+        self.queued += 1
+        return True
+
+    def merge(self, pending: Job, job: Job) -> bool:
+        # Messages typed in a burst are folded into the job that has not started yet,
+        # which also pushes its deadline back by another debounce window, but never past
+        # the longest delay allowed since the first of its messages arrived.
+        if not (pending.coalesce and job.coalesce and pending.func is job.func):
+            return False
+        pending.messages.extend(job.messages)
+        pending.deadline = max(pending.deadline, min(job.deadline, pending.arrived + self.debounce_max))
+        self.coalesced += 1
+        return True
+
+    def schedule(self, chat_id: int) -> None:
+        delay = self.chats[chat_id][0].deadline - time.monotonic()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self.schedule, chat_id)
+        else:
+            self.ready.put_nowait(chat_id)
+
+    async def work(self) -> None:
+        while True:
+            chat_id = await self.ready.get()
+            queue = self.chats[chat_id]
+            if queue[0].deadline > time.monotonic():
+                self.schedule(chat_id)
+                continue
+            job = queue.popleft()
+            self.queued -= 1
+            wait = time.monotonic() - job.deadline
+            self.wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            try:
+                await job.func(job.client, *job.messages)
+            except Exception as exc:
+                logging.critical(exc, exc_info=True)
+            finally:
+                self.processed += 1
+                if queue:
+                    self.schedule(chat_id)
+                else:
+                    del self.chats[chat_id]
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            'queued': self.queued,
+            'chats': len(self.chats),
+            'processed': self.processed,
+            'coalesced': self.coalesced,
+            'shed': self.shed,
+            'avg_wait_ms': round(self.wait / self.processed * 1000) if self.processed else 0,
+            'max_wait_ms': round(self.max_wait * 1000),
+        }
+
+
+dispatcher = Dispatcher(
+    workers=settings.dispatcher_workers,
+    queue_size=settings.dispatcher_queue_size,
+    chat_queue_size=settings.dispatcher_chat_queue_size,
+    debounce=settings.debounce_window,
+    debounce_max=settings.debounce_max
+)
+
+
+def dispatch(func=None, *, coalesce: bool = False):
+    if func is None:
+        return functools.partial(dispatch, coalesce=coalesce)
+
+    @functools.wraps(func)
+    async def wrapper(client: Client, message: Message):
+        if not dispatcher.submit(message.chat.id, Job(func, client, [message], coalesce)):
+            await client.send_message(message.chat.id, 'I am still working on your previous messages, '
+                                                        'give me a moment, please.')
+
+    return wrapper
@@ -12,6 +12,13 @@ def format_design(design: DesignChoice) -> str:
     return '\n'.join(formatted)
 
 
+def format_options(catalog: dict[str, list[str]]) -> str:
+    formatted = []
+    for attribute, options in catalog.items():
+        formatted.append(f'{attribute.replace("_", " ")}: {", ".join(options)}')
+    return '\n'.join(formatted)
+
+
 def format_faq(documents: Iterable[Document]) -> str:
     faq = []
     for i, d in enumerate(documents):
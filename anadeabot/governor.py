@@ -0,0 +1,212 @@
+import json
+import time
+import heapq
+import asyncio
+import itertools
+from contextvars import ContextVar
+
+import httpx
+from openai import DefaultAsyncHttpxClient
+
+from anadeabot.cache import current_node
+from anadeabot.history import history, MESSAGE_OVERHEAD
+from anadeabot.settings import settings
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Set by background jobs, otherwise the priority follows the graph node making a request.
+priority: ContextVar[int | None] = ContextVar('priority', default=None)
+
+
+def current_priority() -> int:
+    if (value := priority.get()) is not None:
+        return value
+    return BACKGROUND if current_node() in settings.background_nodes else INTERACTIVE
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: int) -> float:
+        """Seconds until the amount is available, zero if it is already."""
+        self.refill()
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+    def take(self, amount: int) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateGovernor:
+    """Admits OpenAI requests of the process within rate limits and a concurrency cap.
+
+    Requests wait in a single queue ordered by priority class and arrival. Only the head
+    of the queue is admitted, once both the requests and tokens per minute buckets can
+    cover it and fewer than the allowed number of requests are in flight. A rate limit
+    response pauses admission for the time the API asks to wait.
+    """
+
+    def __init__(self, rpm: int, tpm: int, concurrency: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = concurrency
+        self.running = 0
+        self.paused_until = 0.0
+        self.queue: list[tuple[int, int, int, asyncio.Future]] = []
+        self.order = itertools.count()
+        self.wakeup: asyncio.TimerHandle | None = None
+        self.admitted = dict.fromkeys([INTERACTIVE, BACKGROUND], 0)
+        self.waited = dict.fromkeys([INTERACTIVE, BACKGROUND], 0.0)
+        self.max_wait = 0.0
+        self.throttled = 0
+
+    async def acquire(self, tokens: int, priority: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queue, (priority, next(self.order), tokens, future))
+        queued = time.monotonic()
+        self.dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                self.dispatch()
+            raise
+        waited = time.monotonic() - queued
+        self.admitted[priority] += 1
+        self.waited[priority] += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def release(self) -> None:
+        self.running -= 1
+        self.dispatch()
+
+    def pause(self, seconds: float) -> None:
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.schedule(seconds)
+
+    def dispatch(self) -> None:
+        while self.queue and self.running < self.concurrency:
+            _, _, tokens, future = self.queue[0]
+            if future.cancelled():
+                heapq.heappop(self.queue)
+                continue
+            delay = max(self.paused_until - time.monotonic(), self.requests.delay(1), self.tokens.delay(tokens))
+            if delay > 0:
+                self.schedule(delay)
+                return
+            heapq.heappop(self.queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.running += 1
+            future.set_result(None)
+
+    def schedule(self, delay: float) -> None:
+        if self.wakeup is not None:
+            self.wakeup.cancel()
+        self.wakeup = asyncio.get_running_loop().call_later(delay, self.dispatch)
+
+    def stats(self) -> dict[str, int]:
+        interactive = self.admitted[INTERACTIVE] or 1
+        background = self.admitted[BACKGROUND] or 1
+        return {
+            'queued': len(self.queue),
+            'running': self.running,
+            'admitted': sum(self.admitted.values()),
+            'throttled': self.throttled,
+            'avg_wait_interactive_ms': round(self.waited[INTERACTIVE] / interactive * 1000),
+            'avg_wait_background_ms': round(self.waited[BACKGROUND] / background * 1000),
+            'max_wait_ms': round(self.max_wait * 1000),
+        }
+
+
+class Estimator:
+    """Estimates tokens a request consumes from its body, as OpenAI counts them against the limit."""
+
+    def __init__(self, completion: int):
+        self.completion = completion
+
+    def estimate(self, request: httpx.Request) -> int:
+        try:
+            body = json.loads(request.content or b'{}')
+        except ValueError:
+            return self.completion
+        if request.url.path.endswith('/embeddings'):
+            inputs = body.get('input', [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            # Embeddings may be requested with texts already split into token ids.
+            return sum(len(item) if isinstance(item, list) else history.count_text(item) for item in inputs)
+        tokens = sum(MESSAGE_OVERHEAD + history.count_text(json.dumps(message.get('content') or ''))
+                     for message in body.get('messages', []))
+        if tools := body.get('tools'):
+            tokens += history.count_text(json.dumps(tools))
+        return tokens + (body.get('max_tokens') or self.completion)
+
+
+class ReleasingStream(httpx.AsyncByteStream):
+    """Response body that returns the concurrency slot once it is read or closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, governor: RateGovernor):
+        self.stream = stream
+        self.governor = governor
+        self.released = False
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.released:
+                self.released = True
+                self.governor.release()
+
+
+class GovernedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, governor: RateGovernor, estimator: Estimator, transport: httpx.AsyncBaseTransport):
+        self.governor = governor
+        self.estimator = estimator
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self.governor.acquire(self.estimator.estimate(request), current_priority())
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self.governor.release()
+            raise
+        if response.status_code == 429:
+            try:
+                self.governor.pause(float(response.headers.get('retry-after', 1)))
+            except ValueError:
+                self.governor.pause(1.0)
+        return httpx.Response(response.status_code, headers=response.headers, extensions=response.extensions,
+                              stream=ReleasingStream(response.stream, self.governor))
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+governor = RateGovernor(settings.openai_rpm, settings.openai_tpm, settings.openai_concurrency)
+
+
+def http_client() -> httpx.AsyncClient:
+    """An HTTP client for OpenAI clients, which passes their requests through the governor.
+
+    Only asynchronous requests are governed, synchronous ones would block the event loop.
+    """
+    transport = GovernedTransport(governor, Estimator(settings.completion_token_estimate), httpx.AsyncHTTPTransport())
+    return DefaultAsyncHttpxClient(transport=transport)
@@ -1,33 +1,42 @@
+import time
+import uuid
 from typing import TypedDict, Annotated
-from operator import itemgetter
 
-from langchain_core.messages import SystemMessage, AnyMessage, HumanMessage
-from langchain_core.runnables import RunnableConfig, RunnablePassthrough
+from langchain_core.messages import SystemMessage, AnyMessage, HumanMessage, AIMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
 from langchain_core.pydantic_v1 import ValidationError
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from langgraph.graph import StateGraph, START, END, add_messages
 from langgraph.prebuilt import ToolNode
 from langgraph.graph.state import CompiledStateGraph
 
-from anadeabot.tools import option_tools
-from anadeabot.formatters import format_design, format_faq, format_grounding
-from anadeabot.database import faq_vectorstore, grounding_vectorstore
+from anadeabot.tools import option_tools, option_catalog
+from anadeabot.formatters import format_design, format_faq, format_grounding, format_options
+from anadeabot.index import faq_index, grounding_index, answers
 from anadeabot.helpers import missing_attributes
 from anadeabot import database
+from anadeabot.router import IntentRouter
+from anadeabot.matcher import matcher
+from anadeabot.cache import text_hash
+from anadeabot.history import history, window
+from anadeabot.settings import settings
 from anadeabot.schemas import (
     DesignChoice,
     BooleanOutput,
     UserIntent,
+    TurnAnalysis,
     SupportRequest,
 )
 from anadeabot.prompts import (
     choice_detection_prompt,
+    option_catalog_prompt,
     intent_detection_prompt,
+    turn_analysis_prompt,
     struggle_support_prompt,
     support_details_prompt,
     ask_for_confirmation_prompt,
@@ -42,11 +51,21 @@ from anadeabot.prompts import (
     format_response_prompt,
     acknowledge_request_prompt,
     check_for_request_details,
-    clarify_details_prompt
+    clarify_details_prompt,
+    summarize_history_prompt
 )
 
 TOOLS = [*option_tools]
 
+# Rendered once, so the agent sees every option without a tool round trip.
+OPTION_CATALOG = SystemMessage(option_catalog_prompt.format(options=format_options(option_catalog())))
+
+# Agent calls and the tool round trips they caused, to tell how often tools are still used.
+tool_usage = {'agent_calls': 0, 'round_trips': 0}
+
+# Nodes whose model output is the reply a user sees.
+ANSWER_NODES = {'format', 'struggle', 'decision'}
+
 
 def design_reducer(old, new):
     if new is None:
@@ -64,12 +83,26 @@ class State(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
     design: Annotated[DesignChoice, design_reducer]
     facts: list[Document]
+    query: list[float] | None
+    refined_question: str | None
+    intent: str
+    summary: str
 
 
 class ConfigSchema(TypedDict):
     llm: BaseChatModel
+    sessions: async_sessionmaker[AsyncSession]
+    llms: dict[str, BaseChatModel]
+    router: IntentRouter | None
     thread_id: str
-    session: Session
+    user_id: uuid.UUID
+
+
+def model(config: RunnableConfig) -> BaseChatModel:
+    """The client of the model tier assigned to the running node, the default one if none is."""
+    configurable = config['configurable']
+    node = config.get('metadata', {}).get('langgraph_node')
+    return configurable.get('llms', {}).get(node, configurable['llm'])
 
 
 def tool_redirect(destination: str = '__end__', tool_node: str = 'tools'):
@@ -80,58 +113,97 @@ def tool_redirect(destination: str = '__end__', tool_node: str = 'tools'):
             ai_message = messages[-1]
         else:
             raise ValueError(f'No messages found in input state to tool_edge: {state}')
+        tool_usage['agent_calls'] += 1
         if hasattr(ai_message, 'tool_calls') and len(ai_message.tool_calls) > 0:
+            tool_usage['round_trips'] += 1
             return tool_node
         return destination
 
     return tool_condition
 
 
-def grounding_node(state: State):
+async def grounding_node(state: State):
     if not isinstance(state['messages'][-1], HumanMessage):
-        return {'facts': None}
-    retriever = grounding_vectorstore.as_retriever(search_kwargs={'k': 5})
-    documents = retriever.invoke(state['messages'][-1].content)
-    return {'facts': documents}
+        return {'facts': None, 'query': None, 'refined_question': None}
+    # The message is embedded once per turn, the vector is reused by the router and FAQ search.
+    vector = await database.embeddings.aembed_query(state['messages'][-1].content)
+    documents = await grounding_index.search_by_vector(vector, k=5)
+    return {'facts': documents, 'query': vector, 'refined_question': None}
 
 
-def intent_node(state: State, config: RunnableConfig):
+@window(6)
+async def intent_node(state: State, config: RunnableConfig):
     if not isinstance(state['messages'][-1], HumanMessage):
-        return 'agent'
-    llm = config['configurable']['llm']
+        return {'intent': 'agent'}
+    if (router := config['configurable'].get('router')) and state.get('query') is not None:
+        if intent := router.classify(state['query']):
+            return {'intent': intent}
+    llm = model(config)
     structured = llm.with_structured_output(UserIntent)
     chain = (intent_detection_prompt | structured)
-    intent = chain.invoke({
+    intent = await chain.ainvoke({
         'history': state['messages'],
         'grounding': format_grounding(state['facts'])
     })
+    return {'intent': top_intent(intent)}
+
+
+@window(6)
+async def analysis_node(state: State, config: RunnableConfig):
+    if not isinstance(state['messages'][-1], HumanMessage):
+        return {'design': DesignChoice(), 'intent': 'agent'}
+    llm = model(config)
+    structured = llm.with_structured_output(TurnAnalysis)
+    chain = (turn_analysis_prompt | structured)
+    try:
+        analysis = await chain.ainvoke({
+            'history': state['messages'],
+            'grounding': format_grounding(state['facts'])
+        })
+    except ValidationError:
+        return {'design': DesignChoice(), 'intent': 'agent'}
+    return {'design': analysis.design, 'intent': top_intent(analysis.intent)}
+
+
+def top_intent(intent: UserIntent) -> str:
     detected = [i for i, detected in intent if detected]
     return detected[0] if detected else 'agent'
 
 
-def struggle_node(state: State, config: RunnableConfig):
-    llm = config['configurable']['llm']
+def route(state: State) -> str:
+    return state['intent']
+
+
+@window(8)
+async def struggle_node(state: State, config: RunnableConfig):
+    llm = model(config)
     chain = (struggle_support_prompt | llm)
-    response = chain.invoke({'history': state['messages']})
+    response = await chain.ainvoke({'history': state['messages']})
     return {'messages': response}
 
 
-def choice_node(state: State, config: RunnableConfig):
-    llm = config['configurable']['llm']
+@window(3)
+async def choice_node(state: State, config: RunnableConfig):
+    if not isinstance(state['messages'][-1], HumanMessage):
+        return {'design': DesignChoice()}
+    if settings.choice_matcher and (design := matcher.extract(state['messages'][-1].content)) is not None:
+        return {'design': design}
+    llm = model(config)
     structured = llm.with_structured_output(DesignChoice)
     chain = (choice_detection_prompt | structured)
     try:
-        design = chain.invoke({'history': state['messages']})
+        design = await chain.ainvoke({'history': state['messages']})
     except ValidationError:
         return {'design': DesignChoice()}
     return {'design': design}
 
 
-def preference_node(state: State, config: RunnableConfig):
-    llm = config['configurable']['llm']
+@window(6)
+async def preference_node(state: State, config: RunnableConfig):
+    llm = model(config)
     structured = llm.with_structured_output(BooleanOutput)
     chain = (design_satisfaction_prompt | structured)
-    user_is_satisfied = chain.invoke(state['messages'])
+    user_is_satisfied = await chain.ainvoke(state['messages'])
     design = format_design(state['design'])
     if missing_attributes(state['design']):
         attribute = missing_attributes(state['design'])[0].upper()
@@ -143,88 +215,132 @@ def preference_node(state: State, config: RunnableConfig):
     return {'messages': SystemMessage(prompt)}
 
 
-def decision_node(state: State, config: RunnableConfig):
-    llm = config['configurable']['llm']
+@window(4)
+async def decision_node(state: State, config: RunnableConfig):
+    llm = model(config)
     structured = llm.with_structured_output(BooleanOutput)
     chain = (check_for_confirmation_prompt | structured)
-    confirmation = chain.invoke(state['messages'])
-    if confirmation.value:
-        session = config['configurable']['session']
-        user = database.get_user(config['configurable']['thread_id'], session=session)
-        database.place_order(user, state['design'], session=session)
-        response = (acknowledge_order_prompt | llm).invoke(state['messages'])
+    confirmation = None
+    if settings.choice_matcher and isinstance(state['messages'][-1], HumanMessage):
+        confirmation = matcher.confirm(state['messages'][-1].content)
+    if confirmation is None:
+        confirmation = (await chain.ainvoke(state['messages'])).value
+    if confirmation:
+        async with config['configurable']['sessions'].begin() as session:
+            await database.place_order(config['configurable']['user_id'], state['design'], session=session)
+        response = await (acknowledge_order_prompt | llm).ainvoke(state['messages'])
     else:
-        response = (cancel_design_prompt | llm).invoke(state['messages'])
+        response = await (cancel_design_prompt | llm).ainvoke(state['messages'])
     return {'messages': response, 'design': None}
 
 
-def question_node(state: State, config: RunnableConfig):
-    llm = config['configurable']['llm']
-    retriever = faq_vectorstore.as_retriever(search_kwargs={'k': 4})
-    chain = (
-            RunnablePassthrough
-            .assign(question=question_refinement_prompt | llm | StrOutputParser())
-            .assign(faq=itemgetter('question') | retriever | format_faq)
-            | question_faq_prompt | llm)
-    return {'messages': chain.invoke({
-        'history': state['messages'], 'facts': format_grounding(state['facts'])
-    })}
+@window(4)
+async def question_node(state: State, config: RunnableConfig):
+    llm = model(config)
+    input = {'history': state['messages'], 'facts': format_grounding(state['facts'])}
+    question = await (question_refinement_prompt | llm | StrOutputParser()).ainvoke(input)
+    vector = state.get('query')
+    if vector is None or text_hash(question) != text_hash(state['messages'][-1].content):
+        vector = await database.embeddings.aembed_query(question)
+    if settings.answer_cache and (answer := await answers.lookup(vector)) is not None:
+        return {'messages': AIMessage(answer, response_metadata={'cached': True})}
+    # Only what a cache hit skips is timed, the refinement and lookup are spent either way.
+    started = time.monotonic()
+    faq = await faq_index.search_by_vector(vector, k=4)
+    chain = (question_faq_prompt | llm)
+    response = await chain.ainvoke({**input, 'question': question, 'faq': format_faq(faq)})
+    answers.record(time.monotonic() - started)
+    return {'messages': response, 'query': vector, 'refined_question': question}
+
+
+def answered(state: State) -> str:
+    return summarized(state) if state['messages'][-1].response_metadata.get('cached') else 'format'
 
 
-def support_node(state: State, config: RunnableConfig):
-    llm = config['configurable']['llm']
+def summarized(state: State) -> str:
+    # Most turns end right away, the history is folded only once it outgrows the budget.
+    return 'summarize' if history.outdated(state['messages']) else END
+
+
+@window(6)
+async def support_node(state: State, config: RunnableConfig):
+    llm = model(config)
     structured = llm.with_structured_output(BooleanOutput)
     chain = (check_for_request_details | structured)
-    has_details = chain.invoke({'history': state['messages']})
+    has_details = await chain.ainvoke({'history': state['messages']})
     if has_details.value:
         structured = llm.with_structured_output(SupportRequest)
         chain = (support_details_prompt | structured)
-        request = chain.invoke({'history': state['messages']})
-        session = config['configurable']['session']
-        user = database.get_user(config['configurable']['thread_id'], session=session)
-        database.make_request(user, request.details, session=session)
+        request = await chain.ainvoke({'history': state['messages']})
+        async with config['configurable']['sessions'].begin() as session:
+            await database.make_request(config['configurable']['user_id'], request.details, session=session)
         return {'messages': acknowledge_request_prompt}
     else:
         return {'messages': clarify_details_prompt}
 
 
-def format_node(state: State, config: RunnableConfig):
-    llm = config['configurable']['llm']
+async def format_node(state: State, config: RunnableConfig):
+    llm = model(config)
     chain = (format_response_prompt | llm)
+    started = time.monotonic()
     last_message = state['messages'].pop()
-    response = chain.invoke({'message': last_message.content})
+    response = await chain.ainvoke({'message': last_message.content})
+    if settings.answer_cache and state.get('refined_question'):
+        answers.record(time.monotonic() - started)
+        await answers.store(state['refined_question'], state['query'], response.content)
     return {'messages': response}
 
 
-def agent(state: State, config: RunnableConfig):
-    llm = config['configurable']['llm']
+async def summarize_node(state: State, config: RunnableConfig):
+    outdated = history.outdated(state['messages'])
+    llm = model(config)
+    chain = (summarize_history_prompt | llm | StrOutputParser())
+    summary = await chain.ainvoke({'history': outdated, 'summary': state.get('summary') or 'None'})
+    return {'summary': summary, 'messages': [RemoveMessage(id=message.id) for message in outdated]}
+
+
+@window()
+async def agent(state: State, config: RunnableConfig):
+    llm = model(config)
     llm_with_tools = llm.bind_tools(TOOLS)
-    return {'messages': llm_with_tools.invoke(state['messages'])}
+    messages = [OPTION_CATALOG, *state['messages']] if settings.option_catalog else state['messages']
+    return {'messages': await llm_with_tools.ainvoke(messages)}
 
 
-def create_graph(checkpointer) -> CompiledStateGraph:
+def create_graph(checkpointer, analysis: str = 'separate') -> CompiledStateGraph:
     graph_builder = StateGraph(State, config_schema=ConfigSchema)
     graph_builder.add_node('agent', agent)
     graph_builder.add_node('grounding', grounding_node)
     graph_builder.add_node('struggle', struggle_node)
     graph_builder.add_node('decision', decision_node)
-    graph_builder.add_node('choice', choice_node)
     graph_builder.add_node('preference', preference_node)
     graph_builder.add_node('question', question_node)
     graph_builder.add_node('tools', ToolNode(TOOLS))
     graph_builder.add_node('format', format_node)
     graph_builder.add_node('support', support_node)
-    graph_builder.add_edge(START, 'choice')
-    graph_builder.add_edge('choice', 'grounding')
-    graph_builder.add_conditional_edges('grounding', intent_node,
+    graph_builder.add_node('summarize', summarize_node)
+    if analysis == 'fused':
+        # A single structured call extracts design choices and intent, given grounding facts.
+        graph_builder.add_node('analysis', analysis_node)
+        graph_builder.add_edge(START, 'grounding')
+        graph_builder.add_edge('grounding', 'analysis')
+    else:
+        # Choice extraction and grounding retrieval are independent, so they run in one step.
+        graph_builder.add_node('choice', choice_node)
+        graph_builder.add_node('analysis', intent_node)
+        graph_builder.add_edge(START, 'choice')
+        graph_builder.add_edge(START, 'grounding')
+        graph_builder.add_edge(['choice', 'grounding'], 'analysis')
+    graph_builder.add_conditional_edges('analysis', route,
                                         ['preference', 'decision', 'question', 'struggle', 'support', 'agent'])
     graph_builder.add_edge('support', 'agent')
-    graph_builder.add_edge('struggle', END)
+    graph_builder.add_conditional_edges('struggle', summarized, ['summarize', END])
     graph_builder.add_edge('preference', 'agent')
-    graph_builder.add_edge('question', 'format')
+    graph_builder.add_conditional_edges('question', answered, ['format', 'summarize', END])
     graph_builder.add_edge('tools', 'agent')
     graph_builder.add_conditional_edges('agent', tool_redirect('format'), ['tools', 'format'])
-    graph_builder.add_edge('decision', END)
-    graph_builder.add_edge('format', END)
+    graph_builder.add_conditional_edges('decision', summarized, ['summarize', END])
+    graph_builder.add_conditional_edges('format', summarized, ['summarize', END])
+    graph_builder.add_edge('summarize', END)
     graph = graph_builder.compile(checkpointer=checkpointer)
     return graph
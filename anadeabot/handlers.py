@@ -1,4 +1,3 @@
-from pyrogram import Client
 from pyrogram.types import Message
 from pyrogram import filters
 
@@ -7,32 +6,35 @@ from langchain_core.messages import HumanMessage
 from anadeabot.app import App
 from anadeabot import prompts
 from anadeabot import database
+from anadeabot.replies import reply
 from anadeabot.middleware import contextualize, RequestContext
+from anadeabot.dispatcher import dispatch
 
 
 @App.on_message(filters.command('start'))
+@dispatch
 @contextualize
-def start_handler(client: Client, message: Message, context: RequestContext):
-    state = context.agent.invoke({
+async def start_handler(client: App, message: Message, context: RequestContext):
+    await reply(client, message.chat.id, {
         'messages': [prompts.start_agent_system_prompt, prompts.greeting_prompt]
-    }, config={'configurable': context.config, 'callbacks': [context.tracer]})
-    client.send_message(message.chat.id, state['messages'][-1].content)
+    }, config=context.config)
 
 
 @App.on_message(filters.text & (~filters.command(['start', 'stop'])))
+@dispatch(coalesce=True)
 @contextualize
-def message_handler(client: Client, message: Message, context: RequestContext):
-    state = context.agent.invoke({
-        'messages': HumanMessage(message.text)
-    }, config={'configurable': context.config, 'callbacks': [context.tracer]})
-    client.send_message(message.chat.id, state['messages'][-1].content)
+async def message_handler(client: App, message: Message, context: RequestContext):
+    await reply(client, message.chat.id, {
+        'messages': HumanMessage(context.text)
+    }, config=context.config)
 
 
 @App.on_message(filters.command('stop'))
+@dispatch
 @contextualize
-def stop_handler(client: Client, message: Message, context: RequestContext):
-    state = context.agent.invoke({
+async def stop_handler(client: App, message: Message, context: RequestContext):
+    await reply(client, message.chat.id, {
         'messages': [prompts.say_goodbye_user_prompt]
-    }, config={'configurable': context.config, 'callbacks': [context.tracer]})
-    database.delete_user(context.user, session=context.session)
-    client.send_message(message.chat.id, state['messages'][-1].content)
+    }, config=context.config)
+    async with database.sessions.begin() as session:
+        await database.delete_user(message.chat.id, session=session)
@@ -0,0 +1,107 @@
+import functools
+from collections.abc import Iterable
+
+import tiktoken
+from langchain_core.messages import AnyMessage, HumanMessage, SystemMessage
+
+from anadeabot.cache import LRUCache
+from anadeabot.settings import settings
+
+# Tokens OpenAI adds to every chat message for its role and separators.
+MESSAGE_OVERHEAD = 4
+
+
+def flatten(turns: Iterable[list[AnyMessage]]) -> list[AnyMessage]:
+    return [message for turn in turns for message in turn]
+
+
+class HistoryManager:
+    """Keeps the history a model sees within a token budget.
+
+    Messages before the first user message (the system prompt and greeting) are the
+    preamble and are always kept. Every user message starts a new turn. Once the history
+    outgrows the budget, the oldest turns are folded into a rolling summary stored in the
+    graph state until it shrinks to the watermark, so the summary is rewritten rarely.
+    """
+
+    def __init__(self, model: str, budget: int, watermark: int):
+        self.model = model
+        self.budget = budget
+        self.watermark = watermark
+        self.tokens = LRUCache(10_000)
+
+    @functools.cached_property
+    def encoding(self) -> tiktoken.Encoding:
+        # Loaded on first use, since tiktoken downloads an encoding it has not cached yet.
+        try:
+            return tiktoken.encoding_for_model(self.model)
+        except KeyError:
+            return tiktoken.get_encoding('cl100k_base')
+
+    def count(self, messages: Iterable[AnyMessage]) -> int:
+        total = 0
+        for message in messages:
+            if (tokens := self.tokens.get(message.id)) is None:
+                text = str(message.content) + str(getattr(message, 'tool_calls', None) or '')
+                tokens = self.count_text(text) + MESSAGE_OVERHEAD
+                if message.id:
+                    self.tokens.set(message.id, tokens)
+            total += tokens
+        return total
+
+    def count_text(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    @staticmethod
+    def split(messages: list[AnyMessage]) -> tuple[list[AnyMessage], list[list[AnyMessage]]]:
+        preamble, turns = [], []
+        for message in messages:
+            if isinstance(message, HumanMessage):
+                turns.append([message])
+            elif turns:
+                turns[-1].append(message)
+            else:
+                preamble.append(message)
+        return preamble, turns
+
+    def window(self, messages: list[AnyMessage], summary: str | None, turns: int | None = None) -> list[AnyMessage]:
+        preamble, recent = self.split(messages)
+        if turns is not None:
+            recent = recent[-turns:]
+        context = list(preamble)
+        if summary:
+            context.append(SystemMessage(f'Summary of the earlier conversation:\n{summary}'))
+        budget = self.budget - self.count(context)
+        while len(recent) > 1 and self.count(flatten(recent)) > budget:
+            recent = recent[1:]
+        return [*context, *flatten(recent)]
+
+    def outdated(self, messages: list[AnyMessage]) -> list[AnyMessage]:
+        """Messages to fold into the summary, once the history outgrows the budget."""
+        _, turns = self.split(messages)
+        if len(turns) <= 1 or self.count(messages) <= self.budget:
+            return []
+        # The latest turn is always kept, even if it alone is above the watermark.
+        kept = self.count(messages)
+        folded = 0
+        while folded < len(turns) - 1 and kept > self.watermark:
+            kept -= self.count(turns[folded])
+            folded += 1
+        return flatten(turns[:folded])
+
+
+history = HistoryManager(settings.model, budget=settings.history_budget, watermark=settings.history_watermark)
+
+
+def window(turns: int | None = None):
+    """Lets a node see the rolling summary and at most the given number of latest turns."""
+
+    def decorator(node):
+        @functools.wraps(node)
+        async def wrapper(state, config):
+            messages = history.window(state['messages'], state.get('summary'), turns)
+            return await node({**state, 'messages': messages}, config)
+
+        return wrapper
+
+    return decorator
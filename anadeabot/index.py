@@ -0,0 +1,188 @@
+import json
+import asyncio
+import logging
+from pathlib import Path
+
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_postgres import PGVector
+
+from anadeabot import database
+from anadeabot.cache import AnswerCache
+from anadeabot.router import normalize
+from anadeabot.settings import settings
+
+
+class VectorIndex:
+    """Searches a small PGVector collection in process, using a contiguous float32 matrix.
+
+    Rows are loaded from a memory-mapped snapshot when its signature matches the collection,
+    otherwise from the database, after which the snapshot is rewritten. Until the index is
+    loaded, searches run in the database, over the HNSW index of the collection. The
+    fingerprint of the collection is tracked even when rows are not loaded at all.
+    """
+
+    def __init__(self, vectorstore: PGVector, embeddings: Embeddings, snapshots: Path):
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.snapshot = snapshots / f'{vectorstore.collection_name}.npy'
+        self.manifest = snapshots / f'{vectorstore.collection_name}.json'
+        self.signature: str | None = None
+        self.fingerprinted: str | None = None
+        self.matrix: np.ndarray | None = None
+        self.documents: list[Document] = []
+        self.ids: dict[str, Document] = {}
+        self.searches = 0
+        self.fallbacks = 0
+        self.reloads = 0
+
+    def select(self, *columns) -> sa.Select:
+        store, collection = self.vectorstore.EmbeddingStore, self.vectorstore.CollectionStore
+        return (sa.select(*columns)
+                .join(collection, store.collection_id == collection.uuid)
+                .where(collection.name == self.vectorstore.collection_name))
+
+    async def fingerprint(self) -> str:
+        """A hash over ids and contents of the collection, which changes with any write to it."""
+        store = self.vectorstore.EmbeddingStore
+        entries = sa.func.string_agg(store.id + sa.func.md5(store.document),
+                                     postgresql.aggregate_order_by(sa.literal(','), store.id))
+        async with database.sessions.begin() as session:
+            return await session.scalar(self.select(sa.func.md5(sa.func.coalesce(entries, ''))))
+
+    async def refresh(self, load: bool = True) -> bool:
+        """Loads the collection if it changed since the last load, returns whether it did."""
+        signature = self.fingerprinted = await self.fingerprint()
+        if not load or signature == self.signature:
+            return False
+        if not self.restore(signature):
+            await self.load(signature)
+        self.reloads += 1
+        return True
+
+    def restore(self, signature: str) -> bool:
+        try:
+            manifest = json.loads(self.manifest.read_text())
+            if manifest['signature'] != signature:
+                return False
+            matrix = np.load(self.snapshot, mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return False
+        self.documents = [Document(**document) for document in manifest['documents']]
+        self.ids = {document.id: document for document in self.documents}
+        self.matrix, self.signature = matrix, signature
+        return True
+
+    async def load(self, signature: str) -> None:
+        store = self.vectorstore.EmbeddingStore
+        async with database.sessions.begin() as session:
+            rows = (await session.execute(
+                self.select(store.id, store.document, store.cmetadata, store.embedding).order_by(store.id)
+            )).all()
+        documents = [Document(id=str(id), page_content=document, metadata=metadata or {})
+                     for id, document, metadata, _ in rows]
+        matrix = np.asarray([embedding for *_, embedding in rows], dtype=np.float32)
+        matrix = np.ascontiguousarray(normalize(matrix.reshape(len(rows), settings.dimensionality)))
+        try:
+            self.snapshot.parent.mkdir(parents=True, exist_ok=True)
+            np.save(self.snapshot, matrix)
+            self.manifest.write_text(json.dumps({
+                'signature': signature,
+                'documents': [{'id': d.id, 'page_content': d.page_content, 'metadata': d.metadata} for d in documents]
+            }))
+        except OSError as exc:
+            logging.warning('Snapshot of %s is not saved: %s', self.vectorstore.collection_name, exc)
+        self.documents, self.matrix, self.signature = documents, matrix, signature
+        self.ids = {document.id: document for document in documents}
+
+    def search(self, vector: list[float], k: int) -> list[Document]:
+        scores = self.matrix @ normalize(np.asarray(vector, dtype=np.float32))
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k else []
+        return [self.documents[i] for i in sorted(top, key=lambda i: -scores[i])]
+
+    async def search_database(self, vector: list[float], k: int) -> list[Document]:
+        store, collection = self.vectorstore.EmbeddingStore, self.vectorstore.CollectionStore
+        async with database.sessions.begin() as session:
+            # Partial vector indexes only match a collection id known at planning time, which
+            # generic plans of prepared statements do not have.
+            await session.execute(sa.text('SET LOCAL plan_cache_mode = force_custom_plan'))
+            collection_id = await session.scalar(
+                sa.select(collection.uuid).where(collection.name == self.vectorstore.collection_name)
+            )
+            rows = (await session.execute(
+                sa.select(store.id, store.document, store.cmetadata)
+                .where(store.collection_id == collection_id)
+                .order_by(store.embedding.cosine_distance(vector))
+                .limit(k)
+            )).all()
+        return [Document(id=str(id), page_content=document, metadata=metadata or {})
+                for id, document, metadata in rows]
+
+    async def search_by_vector(self, vector: list[float], k: int) -> list[Document]:
+        if self.matrix is None:
+            self.fallbacks += 1
+            return await self.search_database(vector, k)
+        self.searches += 1
+        return self.search(vector, k)
+
+    def as_retriever(self, k: int) -> Runnable[str, list[Document]]:
+        async def retrieve(query: str) -> list[Document]:
+            return await self.search_by_vector(await self.embeddings.aembed_query(query), k)
+
+        return RunnableLambda(retrieve, name=f'{self.vectorstore.collection_name}_index')
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'rows': len(self.documents),
+            'searches': self.searches,
+            'fallbacks': self.fallbacks,
+            'reloads': self.reloads,
+        }
+
+
+faq_index = VectorIndex(database.faq_vectorstore, database.embeddings, Path(settings.index_snapshot_dir))
+grounding_index = VectorIndex(database.grounding_vectorstore, database.embeddings, Path(settings.index_snapshot_dir))
+
+indexes = [faq_index, grounding_index]
+
+
+async def refresh() -> None:
+    for index in indexes:
+        try:
+            await index.refresh(load=settings.vector_index)
+        except Exception as exc:
+            logging.warning('Index of %s is not refreshed: %s', index.vectorstore.collection_name, exc, exc_info=True)
+
+
+async def watch(interval: float) -> None:
+    """Reloads indexes whose collections changed, e.g. after the knowledge base is synced.
+
+    Collections are fingerprinted even when the in-process index is disabled, since the
+    answer cache is keyed by their signature.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        await refresh()
+
+
+def document(id: str) -> Document | None:
+    for index in indexes:
+        if (found := index.ids.get(id)) is not None:
+            return found
+    return None
+
+
+def knowledge() -> str | None:
+    """Signature of all indexed collections, None until every one of them is fingerprinted."""
+    if any(index.fingerprinted is None for index in indexes):
+        return None
+    return ':'.join(index.fingerprinted for index in indexes)
+
+
+answers = AnswerCache(database.sessions, knowledge, threshold=settings.answer_cache_threshold,
+                      ttl=settings.answer_cache_ttl)
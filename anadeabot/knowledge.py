@@ -0,0 +1,88 @@
+import csv
+import hashlib
+import logging
+from collections.abc import Iterator
+
+import sqlalchemy as sa
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_postgres import PGVector
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential
+
+from anadeabot import database
+from anadeabot.database import FAQ
+from anadeabot.governor import priority, BACKGROUND
+from anadeabot.prompts import grounding_fact_prompt
+
+
+def content_hash(qa: FAQ) -> str:
+    return hashlib.sha256(f'{qa["question"]}\0{qa["answer"]}'.encode()).hexdigest()
+
+
+def read(path: str) -> Iterator[FAQ]:
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            yield {'question': row['question'], 'answer': row['answer']}
+
+
+def batched(rows: Iterator[FAQ], size: int) -> Iterator[list[FAQ]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def stored_ids(vectorstore: PGVector) -> set[str]:
+    store, collection = vectorstore.EmbeddingStore, vectorstore.CollectionStore
+    statement = (sa.select(store.id)
+                 .join(collection, store.collection_id == collection.uuid)
+                 .where(collection.name == vectorstore.collection_name))
+    async with database.sessions.begin() as session:
+        return set(await session.scalars(statement))
+
+
+async def sync(path: str, llm: BaseChatModel, batch: int, concurrency: int, attempts: int = 3) -> dict[str, int]:
+    """Brings the FAQ and grounding collections in line with a CSV of questions and answers.
+
+    Documents are identified by the content hash of their Q/A pair, so only new or changed
+    pairs are embedded and turned into grounding facts, and documents of pairs no longer in
+    the file are deleted. The file is read row by row and processed in batches, every
+    batch is retried as a whole, which is safe since documents are upserted by id.
+    """
+    # Calls of the sync yield to replies to users when it runs in the bot process.
+    priority.set(BACKGROUND)
+    await database.prepare_vectorstores()
+    chain = (grounding_fact_prompt | llm | StrOutputParser())
+    existing = await stored_ids(database.faq_vectorstore) | await stored_ids(database.grounding_vectorstore)
+    seen: set[str] = set()
+    result = {'rows': 0, 'added': 0, 'deleted': 0}
+
+    def changed(rows: Iterator[FAQ]) -> Iterator[FAQ]:
+        for qa in rows:
+            result['rows'] += 1
+            key = content_hash(qa)
+            if key not in seen and not {f'faq-{key}', f'fact-{key}'} <= existing:
+                yield qa
+            seen.add(key)
+
+    for rows in batched(changed(read(path)), batch):
+        keys = [content_hash(qa) for qa in rows]
+        async for attempt in AsyncRetrying(stop=stop_after_attempt(attempts), reraise=True,
+                                           wait=wait_exponential(multiplier=1, max=30)):
+            with attempt:
+                facts = await chain.abatch(rows, config={'max_concurrency': concurrency})
+                await database.create_faq(rows, ids=[f'faq-{key}' for key in keys])
+                await database.add_facts(facts, ids=[f'fact-{key}' for key in keys])
+        result['added'] += len(rows)
+        logging.info('Synced %d of %d rows', result['added'], result['rows'])
+
+    wanted = {f'{kind}-{key}' for key in seen for kind in ('faq', 'fact')}
+    for vectorstore in [database.faq_vectorstore, database.grounding_vectorstore]:
+        if stale := list(await stored_ids(vectorstore) - wanted):
+            await vectorstore.adelete(ids=stale)
+            result['deleted'] += len(stale)
+    return result
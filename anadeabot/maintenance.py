@@ -0,0 +1,132 @@
+import asyncio
+import logging
+
+from anadeabot import database
+from anadeabot import index
+
+# Rows and approximate bytes deleted by pruning since the process started.
+pruned = {
+    'runs': 0, 'checkpoints': 0, 'writes': 0, 'blobs': 0, 'bytes': 0, 'generations': 0, 'answers': 0, 'embeddings': 0,
+}
+
+THREADS = """
+    SELECT DISTINCT thread_id FROM checkpoints
+    WHERE thread_id > %(after)s ORDER BY thread_id LIMIT %(batch)s
+"""
+
+# Checkpoint ids are time ordered, the checkpointer reads the latest one the same way.
+PRUNE_CHECKPOINTS = """
+    WITH ranked AS (
+        SELECT thread_id, checkpoint_ns, checkpoint_id, row_number() OVER (
+            PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+        ) AS rank
+        FROM checkpoints WHERE thread_id = ANY(%(threads)s)
+    ), deleted AS (
+        DELETE FROM checkpoints c USING ranked r
+        WHERE c.thread_id = r.thread_id AND c.checkpoint_ns = r.checkpoint_ns
+            AND c.checkpoint_id = r.checkpoint_id AND r.rank > %(keep)s
+        RETURNING pg_column_size(c.*) AS size
+    )
+    SELECT count(*) AS removed, coalesce(sum(size), 0) AS bytes FROM deleted
+"""
+
+PRUNE_WRITES = """
+    WITH deleted AS (
+        DELETE FROM checkpoint_writes w
+        WHERE w.thread_id = ANY(%(threads)s) AND NOT EXISTS (
+            SELECT 1 FROM checkpoints c WHERE c.thread_id = w.thread_id
+                AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id
+        )
+        RETURNING pg_column_size(w.*) AS size
+    )
+    SELECT count(*) AS removed, coalesce(sum(size), 0) AS bytes FROM deleted
+"""
+
+# The saver writes the blobs of a checkpoint before the checkpoint itself, so a blob no
+# checkpoint points to yet may be about to be. Versions are zero-padded and grow over time,
+# so only blobs older than the oldest version still referenced for their channel are deleted.
+PRUNE_BLOBS = """
+    WITH oldest AS (
+        SELECT c.thread_id, c.checkpoint_ns, v.key AS channel, min(v.value) AS version
+        FROM checkpoints c, jsonb_each_text(c.checkpoint -> 'channel_versions') v
+        WHERE c.thread_id = ANY(%(threads)s)
+        GROUP BY c.thread_id, c.checkpoint_ns, v.key
+    ), deleted AS (
+        DELETE FROM checkpoint_blobs b USING oldest o
+        WHERE b.thread_id = o.thread_id AND b.checkpoint_ns = o.checkpoint_ns
+            AND b.channel = o.channel AND b.version < o.version
+        RETURNING pg_column_size(b.*) AS size
+    )
+    SELECT count(*) AS removed, coalesce(sum(size), 0) AS bytes FROM deleted
+"""
+
+
+async def prune_checkpoints(keep: int, batch: int) -> dict[str, int]:
+    """Keeps the latest checkpoints of every thread and deletes the writes and blobs they no longer use.
+
+    Threads are processed in batches, each in its own short transaction, so the tables are
+    never locked for long. Bytes are the sizes of deleted rows, the space is reused by
+    Postgres after a vacuum rather than returned to the system.
+    """
+    result = {'threads': 0, 'checkpoints': 0, 'writes': 0, 'blobs': 0, 'bytes': 0}
+    after = ''
+    while True:
+        async with database.pool.connection() as connection:
+            threads = [row['thread_id'] for row in await (
+                await connection.execute(THREADS, {'after': after, 'batch': batch})
+            ).fetchall()]
+            if not threads:
+                break
+            async with connection.transaction():
+                for key, statement in [('checkpoints', PRUNE_CHECKPOINTS), ('writes', PRUNE_WRITES),
+                                       ('blobs', PRUNE_BLOBS)]:
+                    deleted = await (
+                        await connection.execute(statement, {'threads': threads, 'keep': keep})
+                    ).fetchone()
+                    result[key] += deleted['removed']
+                    result['bytes'] += deleted['bytes']
+        result['threads'] += len(threads)
+        after = threads[-1]
+    pruned['runs'] += 1
+    for key in ['checkpoints', 'writes', 'blobs', 'bytes']:
+        pruned[key] += result[key]
+    return result
+
+
+async def purge_generations() -> int:
+    """Deletes expired model responses cached in Postgres."""
+    async with database.pool.connection() as connection:
+        deleted = await connection.execute('DELETE FROM generation WHERE gen_expires_at <= localtimestamp')
+    pruned['generations'] += deleted.rowcount
+    return deleted.rowcount
+
+
+async def purge_embeddings(ttl: float) -> int:
+    """Deletes cached embeddings older than the TTL, texts still asked about are embedded again."""
+    async with database.pool.connection() as connection:
+        deleted = await connection.execute(
+            'DELETE FROM embedding WHERE emb_created_at <= localtimestamp - make_interval(secs => %s)', [ttl]
+        )
+    pruned['embeddings'] += deleted.rowcount
+    return deleted.rowcount
+
+
+async def purge_answers() -> int:
+    """Deletes expired answers and, once the knowledge signature is known, answers to outdated knowledge."""
+    deleted = await index.answers.purge(index.knowledge())
+    pruned['answers'] += deleted
+    return deleted
+
+
+async def prune_periodically(interval: float, keep: int, batch: int, embedding_ttl: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await prune_checkpoints(keep, batch)
+            result['generations'] = await purge_generations()
+            result['answers'] = await purge_answers()
+            result['embeddings'] = await purge_embeddings(embedding_ttl)
+        except Exception as exc:
+            logging.warning('Checkpoints are not pruned: %s', exc, exc_info=True)
+        else:
+            logging.info('Pruned checkpoints: %s', ', '.join(f'{key}={value}' for key, value in result.items()))
@@ -0,0 +1,179 @@
+import re
+from enum import StrEnum
+
+from anadeabot import options
+from anadeabot.schemas import DesignChoice
+
+# Spellings users type for every option, in lowercase with hyphens replaced by spaces.
+ALIASES: dict[str, dict[StrEnum, list[str]]] = {
+    'color': {
+        options.TShirtColor.WHITE: ['white', 'whit', 'whte', 'wite'],
+        options.TShirtColor.BLACK: ['black', 'blak', 'blck', 'balck'],
+        options.TShirtColor.BLUE: ['blue', 'blu', 'bleu'],
+        options.TShirtColor.RED: ['red'],
+        options.TShirtColor.GREEN: ['green', 'gren', 'grean', 'greeen'],
+    },
+    'size': {
+        options.TShirtSize.XS: ['xs', 'extra small', 'x small', 'xsmall'],
+        options.TShirtSize.S: ['small', 'size s'],
+        options.TShirtSize.M: ['medium', 'meduim', 'size m'],
+        options.TShirtSize.L: ['large', 'size l'],
+        options.TShirtSize.XL: ['xl', 'extra large', 'x large', 'xlarge'],
+        options.TShirtSize.XLL: ['xll', 'xxl', '2xl', 'xx large', 'double extra large'],
+    },
+    'style': {
+        options.TShirtStyle.CREW_NECK: ['crew neck', 'crewneck', 'crew', 'round neck'],
+        options.TShirtStyle.V_NECK: ['v neck', 'vneck', 'v nek'],
+        options.TShirtStyle.LONG_SLEEVE: ['long sleeve', 'long sleeves', 'long sleeved', 'longsleeve', 'long slevee'],
+        options.TShirtStyle.TANK_TOP: ['tank top', 'tanktop', 'tank', 'sleeveless'],
+    },
+    'gender': {
+        options.TShirtGender.MALE: ['male', 'men', 'mens', "men's", 'man', 'masculine'],
+        options.TShirtGender.FEMALE: ['female', 'women', 'womens', "women's", 'woman', 'feminine', 'ladies'],
+        options.TShirtGender.UNISEX: ['unisex', 'uni sex', 'gender neutral'],
+    },
+    'printing': {
+        options.TShirtPrintingOptions.SCREEN_PRINTING: ['screen printing', 'screen print', 'screenprint',
+                                                        'silk screen', 'silkscreen'],
+        options.TShirtPrintingOptions.EMBROIDERY: ['embroidery', 'embroidered', 'embroider', 'embroidary',
+                                                   'embriodery', 'embrodery'],
+        options.TShirtPrintingOptions.HEAT_TRANSFER: ['heat transfer', 'heat press', 'heat transfers'],
+        options.TShirtPrintingOptions.DIRECT_TO_GARMENT: ['direct to garment', 'dtg'],
+    },
+}
+
+# Aliases that are plain words as well, trusted only where they describe the shirt itself.
+QUALIFIED = [
+    'small', 'medium', 'meduim', 'large', 'extra small', 'x small', 'extra large', 'x large', 'xx large',
+    'double extra large', 'tank', 'crew',
+]
+
+# A qualified alias describes the shirt when it follows the word size, ends a clause, or
+# comes before a word naming the shirt.
+SHIRT_BEFORE = re.compile(r"\bsize\W*$")
+SHIRT_AFTER = re.compile(r"\s*(?:[,.;!]|$)|\s+(?:please|size|sized|t shirt|tshirt|shirt|tee|one|top)\b")
+
+# Nouns of the artwork, which a size word before them describes instead of the shirt.
+ARTWORK = re.compile(r"\s+(?:logo|print|design|image|picture|photo|text|graphic|lettering|letters)s?\b")
+
+# Aliases naming people, trusted only where they name who the shirt is for, as in "for men"
+# or "a women's tee", unlike "thanks man".
+GENDERED = ['man', 'men', 'mens', "men's", 'woman', 'women', 'womens', "women's", 'ladies']
+WEARER_BEFORE = re.compile(r"\bfor\s+(?:a\s+|the\s+)?$")
+WEARER_AFTER = re.compile(r"\s+(?:t shirt|tshirt|shirt|tee|top|fit|cut|style|size|one)s?\b")
+
+# Phrases that let the bot choose the remaining options on its own.
+DELEGATION_CUES = [
+    'any', 'whatever', 'random', 'surprise me', 'you decide', 'you choose', 'up to you', 'the rest',
+    "doesn't matter", 'dont care', "don't care",
+]
+
+# Words that hint at a choice the aliases cannot resolve: custom colors, references to
+# previously suggested options, or changes of mind.
+CHOICE_CUES = [
+    *DELEGATION_CUES, 'color', 'colour', 'size', 'style', 'gender', 'print', 'printing', 'sleeve',
+    'neck', 'fit', 'choose', 'chose', 'pick', 'prefer', 'want', 'like', 'take', 'go with', 'make it',
+    'change', 'switch', 'instead', 'first', 'second', 'third', 'last one', 'same', 'custom', 'navy',
+    'grey', 'gray', 'yellow', 'purple', 'pink', 'orange', 'brown', 'beige', 'maroon', 'teal', 'olive',
+]
+
+NEGATION = re.compile(r"\b(?:not|no|don't|dont|never|without|instead of|rather than|except)\b(?:\W+\w+){0,3}\W*$")
+
+AFFIRMATIVE = re.compile(
+    r"^(?:yes|yep|yeah|yup|sure|ok|okay|confirm|confirmed|correct|that's correct|go ahead|do it|"
+    r"place the order|place my order|order it|sounds good|perfect|absolutely|of course)"
+    r"(?:\W+(?:please|thanks|thank you))?\W*$"
+)
+NEGATIVE = re.compile(
+    r"^(?:no|nope|nah|cancel|cancel it|cancel the order|don't|do not|not now|never mind|nevermind|"
+    r"i changed my mind|forget it)(?:\W+(?:please|thanks|thank you))?\W*$"
+)
+
+
+def alternation(phrases) -> str:
+    return '|'.join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+
+
+def normalize(text: str) -> str:
+    text = text.lower().replace('’', "'")
+    return re.sub(r'\s+', ' ', re.sub(r'[-_/]', ' ', text)).strip()
+
+
+class ChoiceMatcher:
+    """Extracts design choices and confirmations stated literally in a message, without a model call."""
+
+    def __init__(self, aliases: dict[str, dict[StrEnum, list[str]]], qualified: list[str], gendered: list[str],
+                 cues: list[str], delegation: list[str]):
+        self.lookup = {
+            alias: (attribute, value)
+            for attribute, values in aliases.items()
+            for value, spellings in values.items()
+            for alias in spellings
+        }
+        self.options = re.compile(rf"(?<![\w'])(?:{alternation(self.lookup)})(?![\w'])")
+        self.qualified = set(qualified)
+        self.gendered = set(gendered)
+        # Single letter sizes are only trusted when typed in uppercase.
+        self.sizes = re.compile(r"(?<![\w'’])(S|M|L)(?![\w'’])")
+        self.cues = re.compile(rf"\b(?:{alternation(cues)})\b")
+        self.delegation = re.compile(rf"\b(?:{alternation(delegation)})\b")
+        self.matched = 0
+        self.skipped = 0
+        self.deferred = 0
+
+    def extract(self, text: str) -> DesignChoice | None:
+        """Returns literal choices, an empty design when a message shows no sign of a choice,
+        or None when the message has to be interpreted by the LLM."""
+        normalized = normalize(text)
+        found: dict[str, set[str]] = {}
+        for match in self.options.finditer(normalized):
+            if match.group() in self.qualified and not self.describes_shirt(normalized, match):
+                # A large logo or a small print is for the LLM, while tank in "tank you" is just a typo.
+                if ARTWORK.match(normalized, match.end()):
+                    return self.defer()
+                continue
+            if match.group() in self.gendered and not self.names_wearer(normalized, match):
+                continue
+            if NEGATION.search(normalized[:match.start()]):
+                return self.defer()
+            attribute, value = self.lookup[match.group()]
+            found.setdefault(attribute, set()).add(value)
+        for match in self.sizes.finditer(text):
+            found.setdefault('size', set()).add(options.TShirtSize(match.group()))
+        if found and (any(len(values) > 1 for values in found.values()) or normalized.endswith('?')
+                      or self.delegation.search(normalized)):
+            return self.defer()
+        if found:
+            self.matched += 1
+            return DesignChoice(**{attribute: values.pop() for attribute, values in found.items()})
+        if self.cues.search(normalized):
+            return self.defer()
+        self.skipped += 1
+        return DesignChoice()
+
+    @staticmethod
+    def describes_shirt(text: str, match: re.Match) -> bool:
+        return bool(SHIRT_BEFORE.search(text[:match.start()]) or SHIRT_AFTER.match(text, match.end()))
+
+    @staticmethod
+    def names_wearer(text: str, match: re.Match) -> bool:
+        return bool(WEARER_BEFORE.search(text[:match.start()]) or WEARER_AFTER.match(text, match.end()))
+
+    def confirm(self, text: str) -> bool | None:
+        """Resolves plain yes or no answers, None if a message is anything else."""
+        normalized = normalize(text)
+        if AFFIRMATIVE.match(normalized):
+            return True
+        if NEGATIVE.match(normalized):
+            return False
+        return None
+
+    def defer(self) -> None:
+        self.deferred += 1
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {'matched': self.matched, 'skipped': self.skipped, 'deferred': self.deferred}
+
+
+matcher = ChoiceMatcher(ALIASES, QUALIFIED, GENDERED, CHOICE_CUES, DELEGATION_CUES)
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+
+from anadeabot import database
+from anadeabot import replies
+from anadeabot import maintenance
+from anadeabot.index import faq_index, grounding_index, answers
+from anadeabot.graph import tool_usage
+from anadeabot.router import router
+from anadeabot.matcher import matcher
+from anadeabot.dispatcher import dispatcher
+from anadeabot.governor import governor
+from anadeabot.decorators import registry
+
+reporters, reporter = registry()
+
+
+def collect() -> dict[str, dict]:
+    return {func.__name__: func() for func in reporters}
+
+
+async def report(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        for name, stats in collect().items():
+            logging.info('%s: %s', name, ', '.join(f'{key}={value}' for key, value in stats.items()))
+
+
+@reporter
+def pool() -> dict[str, int]:
+    return database.pool_stats()
+
+
+@reporter
+def users() -> dict[str, int]:
+    return database.users.stats()
+
+
+@reporter
+def embeddings() -> dict[str, int]:
+    return database.embeddings.stats()
+
+
+@reporter
+def faq() -> dict[str, int]:
+    return faq_index.stats()
+
+
+@reporter
+def grounding() -> dict[str, int]:
+    return grounding_index.stats()
+
+
+@reporter
+def answer_cache() -> dict[str, int | float]:
+    return answers.stats()
+
+
+@reporter
+def checkpoints() -> dict[str, int]:
+    return maintenance.pruned
+
+
+@reporter
+def llm_cache() -> dict[str, int | float]:
+    return database.llm_cache.stats() if database.llm_cache else {}
+
+
+@reporter
+def openai() -> dict[str, int]:
+    return governor.stats()
+
+
+@reporter
+def queue() -> dict[str, int | float]:
+    return dispatcher.stats()
+
+
+@reporter
+def intents() -> dict[str, int]:
+    return router.stats()
+
+
+@reporter
+def choices() -> dict[str, int]:
+    return matcher.stats()
+
+
+@reporter
+def tools() -> dict[str, int | float]:
+    turns = tool_usage['agent_calls'] - tool_usage['round_trips']
+    return {**tool_usage, 'per_turn': round(tool_usage['round_trips'] / turns, 2) if turns else 0}
+
+
+@reporter
+def streaming() -> dict[str, int]:
+    return replies.stats()
@@ -2,7 +2,8 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import ForeignKey, Uuid, Text, String, func
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import ForeignKey, Uuid, Text, String, Integer, LargeBinary, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, MappedAsDataclass
 
 
@@ -14,7 +15,7 @@ class User(Base):
     __tablename__ = 'user'
 
     id: Mapped[uuid.UUID] = mapped_column('user_id', Uuid, primary_key=True, insert_default=uuid.uuid4, init=False)
-    telegram_id: Mapped[str] = mapped_column('user_telegram_id', Text, nullable=False)
+    telegram_id: Mapped[str] = mapped_column('user_telegram_id', Text, nullable=False, unique=True, index=True)
     personality: Mapped[Optional[str]] = mapped_column('user_personality', Text, nullable=True, default=None)
 
     orders: Mapped[list['Order']] = relationship(default_factory=list, cascade='all, delete', passive_deletes=True,
@@ -44,3 +45,33 @@ class Request(Base):
     details: Mapped[str] = mapped_column('req_details', Text, nullable=False)
     submitted_at: Mapped[datetime] = mapped_column('req_submitted_at', server_default=func.CURRENT_TIMESTAMP(),
                                                    init=False)
+
+
+class Embedding(Base):
+    __tablename__ = 'embedding'
+
+    model: Mapped[str] = mapped_column('emb_model', String, primary_key=True)
+    dimensionality: Mapped[int] = mapped_column('emb_dimensionality', Integer, primary_key=True)
+    text_hash: Mapped[bytes] = mapped_column('emb_text_hash', LargeBinary, primary_key=True)
+    vector: Mapped[list[float]] = mapped_column('emb_vector', Vector, nullable=False)
+    created_at: Mapped[datetime] = mapped_column('emb_created_at', server_default=func.CURRENT_TIMESTAMP(), init=False)
+
+
+class Answer(Base):
+    __tablename__ = 'answer'
+
+    id: Mapped[uuid.UUID] = mapped_column('ans_id', Uuid, primary_key=True, insert_default=uuid.uuid4, init=False)
+    question: Mapped[str] = mapped_column('ans_question', Text, nullable=False)
+    vector: Mapped[list[float]] = mapped_column('ans_vector', Vector, nullable=False)
+    answer: Mapped[str] = mapped_column('ans_answer', Text, nullable=False)
+    knowledge: Mapped[str] = mapped_column('ans_knowledge', String, nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column('ans_created_at', server_default=func.CURRENT_TIMESTAMP(), init=False)
+
+
+class CachedGeneration(Base):
+    __tablename__ = 'generation'
+
+    key: Mapped[bytes] = mapped_column('gen_key', LargeBinary, primary_key=True)
+    node: Mapped[str] = mapped_column('gen_node', String, nullable=False)
+    value: Mapped[str] = mapped_column('gen_value', Text, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column('gen_expires_at', nullable=False, index=True)
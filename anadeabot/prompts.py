@@ -13,6 +13,11 @@ start_agent_system_prompt = SystemMessage("""
     support. 
 """)
 
+option_catalog_prompt = PromptTemplate.from_template("""
+    These are ALL available T-shirt design options, you do not need to look
+    them up. Suggest only these options to a user.\n\nOptions:\n{options}
+""")
+
 greeting_prompt = SystemMessage("""
     Say a greeting to a user, briefly explain what the T-shirt design platform
     is and how you can help the user to create their awesome T-shirt, and in the
@@ -42,6 +47,22 @@ intent_detection_prompt = ChatPromptTemplate.from_messages([
     """)
 ])
 
+turn_analysis_prompt = ChatPromptTemplate.from_messages([
+    MessagesPlaceholder('history'),
+    SystemMessagePromptTemplate.from_template("""
+        Given the above conversation and ground truth knowledge, analyze the last
+        message of a user. First, if a user made a choice of some of the T-shirt
+        design attributes, or decided to change their mind about previously chosen
+        attribute options, then try to infer their values. If a user is not
+        interested in a specific attribute, or is ready to go with an arbitrary
+        option, choose an option for that attribute on your own. If some attributes
+        are not present, just leave them NONE, DO NOT MAKE UP VALUES. If a user
+        specified unavailable options, LEAVE IT EMPTY. Second, try to detect a
+        user's intent at the moment. If you are not sure in exactly one intent of
+        a user, select several of them.\n\nGround truth:\n{grounding}
+    """)
+])
+
 design_satisfaction_prompt = ChatPromptTemplate.from_messages([
     MessagesPlaceholder('history'),
     SystemMessage("""
@@ -190,7 +211,24 @@ format_response_prompt = ChatPromptTemplate.from_messages([
     """)
 ])
 
+summarize_history_prompt = ChatPromptTemplate.from_messages([
+    MessagesPlaceholder('history'),
+    SystemMessagePromptTemplate.from_template("""
+        Summarize the above part of a conversation between a user and a T-shirt
+        design assistant, extending the previous summary. Keep T-shirt design
+        choices, placed orders, support requests, open questions and preferences
+        of a user. BE BRIEF.\n\nPrevious summary:\n{summary}
+    """)
+])
+
 say_goodbye_user_prompt = SystemMessage("""
     A user decided to leave our platform, so say goodbye to a user, thank them
     for using our platform, wish good luck.
 """)
+
+grounding_fact_prompt = PromptTemplate.from_template("""
+    Given a question and its answer, COMPOSE them together into a single piece
+    of knowledge, something like: "to do this, you have to do this" or "it works
+    in this way" or just as a fact and REPHRASE the piece of knowledge to be
+    complete and self-contained.\n\nQuestion:\n{question}\n\nAnswer:\n{answer}
+""")
@@ -0,0 +1,57 @@
+import time
+import asyncio
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait, MessageNotModified
+
+from anadeabot.settings import settings
+
+PLACEHOLDER = '...'
+
+# Time to the first visible token and to the complete reply, summed over streamed replies.
+timings = {'replies': 0, 'first_token': 0.0, 'complete': 0.0}
+
+
+async def reply(client: Client, chat_id: int, input: dict, config: dict) -> None:
+    """Runs the graph and sends its last message, editing a placeholder as tokens arrive if streaming."""
+    if not settings.streaming:
+        state = await client.runtime.agent.ainvoke(input, config=config)
+        await client.send_message(chat_id, state['messages'][-1].content)
+        return
+    started = time.monotonic()
+    message = await client.send_message(chat_id, PLACEHOLDER)
+    shown, edited_at, first_token = PLACEHOLDER, 0.0, None
+    text = shown
+    async for text in client.runtime.stream(input, config):
+        if text.strip() and text != shown and time.monotonic() - edited_at >= settings.stream_edit_interval:
+            try:
+                await client.edit_message_text(chat_id, message.id, text)
+                shown, edited_at = text, time.monotonic()
+                first_token = first_token or edited_at
+            except FloodWait as exc:
+                edited_at = time.monotonic() + exc.value
+    if text != shown:
+        await finish(client, chat_id, message.id, text)
+    complete = time.monotonic()
+    timings['replies'] += 1
+    timings['first_token'] += (first_token or complete) - started
+    timings['complete'] += complete - started
+
+
+def stats() -> dict[str, int]:
+    replies = timings['replies'] or 1
+    return {
+        'replies': timings['replies'],
+        'avg_first_token_ms': round(timings['first_token'] / replies * 1000),
+        'avg_complete_ms': round(timings['complete'] / replies * 1000),
+    }
+
+
+async def finish(client: Client, chat_id: int, message_id: int, text: str) -> None:
+    try:
+        await client.edit_message_text(chat_id, message_id, text)
+    except FloodWait as exc:
+        await asyncio.sleep(exc.value)
+        await client.edit_message_text(chat_id, message_id, text)
+    except MessageNotModified:
+        pass
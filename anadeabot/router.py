@@ -0,0 +1,74 @@
+import logging
+
+import yaml
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from anadeabot.settings import settings
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).eps)
+
+
+class IntentRouter:
+    """Classifies a message by cosine similarity to labeled exemplar phrases.
+
+    A message is routed only when the best intent scores above the threshold and
+    beats the runner-up by the margin, otherwise the caller falls back to the LLM.
+    Deferred intents depend on what the bot asked before, which a single message does
+    not show, so messages closest to them are always left to the LLM.
+    """
+
+    def __init__(self, exemplars: dict[str, list[str]], threshold: float, margin: float,
+                 deferred: frozenset[str] = frozenset()):
+        self.exemplars = exemplars
+        self.threshold = threshold
+        self.margin = margin
+        self.deferred = deferred
+        self.intents = list(exemplars)
+        # Exemplars are stored grouped by intent, offsets mark where each group starts.
+        self.offsets = np.cumsum([0] + [len(phrases) for phrases in exemplars.values()][:-1])
+        self.matrix: np.ndarray | None = None
+        self.routed = 0
+        self.ambiguous = 0
+        self.deferrals = 0
+
+    @classmethod
+    def from_file(cls, path: str, threshold: float, margin: float,
+                  deferred: frozenset[str] = frozenset()) -> 'IntentRouter':
+        with open(path) as file:
+            return cls(yaml.safe_load(file), threshold, margin, deferred)
+
+    async def fit(self, embeddings: Embeddings) -> None:
+        phrases = [phrase for group in self.exemplars.values() for phrase in group]
+        try:
+            vectors = await embeddings.aembed_documents(phrases)
+        except Exception as exc:
+            logging.warning('Intent router is disabled: %s', exc, exc_info=True)
+            return
+        self.matrix = normalize(np.asarray(vectors, dtype=np.float32))
+
+    def classify(self, vector: list[float]) -> str | None:
+        if self.matrix is None:
+            return None
+        scores = self.matrix @ normalize(np.asarray(vector, dtype=np.float32))
+        best = np.maximum.reduceat(scores, self.offsets)
+        second, first = np.argsort(best)[-2:]
+        if best[first] < self.threshold or best[first] - best[second] < self.margin:
+            self.ambiguous += 1
+            return None
+        if self.intents[first] in self.deferred:
+            self.deferrals += 1
+            return None
+        self.routed += 1
+        return self.intents[first]
+
+    def stats(self) -> dict[str, int]:
+        return {'routed': self.routed, 'ambiguous': self.ambiguous, 'deferred': self.deferrals}
+
+
+# A decision only means something right after the bot asked to confirm an order.
+router = IntentRouter.from_file('data/intents.yaml', threshold=settings.router_threshold, margin=settings.router_margin,
+                                deferred=frozenset({'decision'}))
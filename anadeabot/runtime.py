@@ -0,0 +1,63 @@
+from collections.abc import AsyncIterator
+
+from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable
+from langchain_core.tracers import LangChainTracer
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from langsmith import Client
+
+from anadeabot import database
+from anadeabot import index
+from anadeabot.router import router
+from anadeabot.governor import http_client
+from anadeabot.settings import settings
+from anadeabot.graph import create_graph, ANSWER_NODES
+
+
+class Runtime:
+    """Long-lived objects shared by all chats: the compiled graph, model clients and tracer."""
+
+    def __init__(self, checkpointer: BaseCheckpointSaver):
+        self.llms = {
+            tier: ChatOpenAI(model=model, api_key=settings.OPENAI_API_KEY, temperature=0.1, cache=database.llm_cache,
+                             timeout=settings.tier_timeouts.get(tier, settings.llm_timeout),
+                             http_async_client=http_client(), tags=[f'tier:{tier}'], metadata={'model_tier': tier})
+            for tier, model in {'default': settings.model, **settings.model_tiers}.items()
+        }
+        self.llm = self.llms['default']
+        self.embeddings = database.embeddings
+        self.tracer = LangChainTracer(project_name='TeeCustomizer',
+                                      client=Client(api_key=settings.LANGCHAIN_API_KEY))
+        self.checkpointer = checkpointer
+        self.graph = create_graph(checkpointer, analysis=settings.turn_analysis)
+        self.agent: Runnable = self.graph.with_config(
+            configurable={
+                'llm': self.llm,
+                'llms': {node: self.llms[tier] for node, tier in settings.node_tiers.items()},
+                'sessions': database.sessions,
+                'router': router if settings.intent_router else None
+            },
+            callbacks=[self.tracer]
+        )
+
+    async def open(self) -> None:
+        await database.prepare_vectorstores()
+        if settings.intent_router:
+            await router.fit(self.embeddings)
+        await index.refresh()
+
+    async def stream(self, input: dict, config: dict) -> AsyncIterator[str]:
+        """Yields the reply as it grows token by token, and the complete last message at the end."""
+        root, reply, state = None, '', None
+        async for event in self.agent.astream_events(input, config=config, version='v2'):
+            root = root or event['run_id']
+            if event['metadata'].get('langgraph_node') in ANSWER_NODES:
+                if event['event'] == 'on_chat_model_start':
+                    reply = ''
+                elif event['event'] == 'on_chat_model_stream' and event['data']['chunk'].content:
+                    reply += event['data']['chunk'].content
+                    yield reply
+            elif event['event'] == 'on_chain_end' and event['run_id'] == root:
+                state = event['data']['output']
+        yield state['messages'][-1].content
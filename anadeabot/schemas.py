@@ -114,6 +114,23 @@ class UserIntent(BaseModel):
                     conversation.""")
 
 
+class TurnAnalysis(BaseModel):
+    """Design choices a user made in their last message and the most probable
+    intent of a user at the moment."""
+
+    design: DesignChoice = Field(
+        default_factory=DesignChoice,
+        description="""T-shirt attribute design choices a user made or changed. EVERY
+                    FIELD IS OPTIONAL, leave attributes a user did not choose EMPTY."""
+    )
+
+    intent: UserIntent = Field(
+        default_factory=UserIntent,
+        description="""The most probable intent of a user. If you are not sure in
+                    exactly one intent of a user, select several of them."""
+    )
+
+
 class SupportRequest(BaseModel):
     """A user wants to make a request to customer support because they faced
     some problem, have a question or require a help of a human specialist.
@@ -0,0 +1,136 @@
+import zlib
+from array import array
+from enum import StrEnum
+from collections.abc import Callable
+from typing import Any
+
+import orjson
+from langchain_core.documents import Document
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from anadeabot import options
+from anadeabot.schemas import DesignChoice
+
+# Options of every design attribute, a choice is stored as its position starting from 1.
+DESIGN_CODES: dict[str, list[StrEnum]] = {
+    'color': list(options.TShirtColor),
+    'size': list(options.TShirtSize),
+    'style': list(options.TShirtStyle),
+    'gender': list(options.TShirtGender),
+    'printing': list(options.TShirtPrintingOptions),
+}
+
+# Lists of floats shorter than this are not worth packing as float32.
+VECTOR_LENGTH = 64
+
+COMPRESSED = '+zlib'
+
+PASSTHROUGH = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """Checkpoint serializer that keeps blobs of the graph state small.
+
+    A design is stored as option codes, retrieved facts as ids of grounding documents and
+    embeddings as packed float32. Anything else is JSON written with orjson, and values
+    larger than the threshold are compressed.
+    """
+
+    def __init__(self, documents: Callable[[str], Document | None], threshold: int, level: int = 3):
+        super().__init__()
+        self.documents = documents
+        self.threshold = threshold
+        self.level = level
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            # Types the standard encoder revives on load are passed to its default function.
+            # UUIDs are written natively by orjson and come back as strings, the state has none.
+            return orjson.dumps(obj, default=self._default, option=PASSTHROUGH)
+        except TypeError:
+            # Non-string keys or integers out of range are left to the standard encoder.
+            return super().dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.revive(orjson.loads(data))
+
+    def revive(self, value: Any) -> Any:
+        # Same as the object hook of the standard decoder, which orjson does not support.
+        if isinstance(value, dict):
+            return self._reviver({key: self.revive(item) for key, item in value.items()})
+        if isinstance(value, list):
+            return [self.revive(item) for item in value]
+        return value
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        if isinstance(obj, DesignChoice):
+            kind, data = 'design', orjson.dumps([encode_choice(a, getattr(obj, a)) for a in DESIGN_CODES])
+        elif is_documents(obj) and all(document.id for document in obj):
+            kind, data = 'documents', orjson.dumps([document.id for document in obj])
+        elif is_vector(obj):
+            kind, data = 'vector', array('f', obj).tobytes()
+        else:
+            kind, data = super().dumps_typed(obj)
+        if self.threshold and len(data) > self.threshold:
+            return kind + COMPRESSED, zlib.compress(data, self.level)
+        return kind, data
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        kind, blob = data
+        if kind.endswith(COMPRESSED):
+            kind, blob = kind.removesuffix(COMPRESSED), zlib.decompress(blob)
+        if kind == 'design':
+            return DesignChoice(**{
+                attribute: decode_choice(attribute, code) for attribute, code in zip(DESIGN_CODES, orjson.loads(blob))
+            })
+        if kind == 'documents':
+            # Documents deleted from the collection since are dropped, facts are retrieved anew every turn.
+            return [document for id in orjson.loads(blob) if (document := self.documents(id)) is not None]
+        if kind == 'vector':
+            return array('f', blob).tolist()
+        return super().loads_typed((kind, blob))
+
+
+class MetadataSerializer(JsonPlusSerializer):
+    """Serializer of checkpoint metadata, which keeps retrieved facts and embeddings out of it.
+
+    Metadata records the writes of every step, the same values the channel blobs already
+    store compactly. Facts are recorded as document ids and embeddings are left out.
+    """
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        if isinstance(obj, dict) and obj.get('writes'):
+            obj = {**obj, 'writes': compact_writes(obj['writes'])}
+        return super().dumps_typed(obj)
+
+
+def compact_writes(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: compact_writes(item) for key, item in value.items() if not is_vector(item)}
+    if is_documents(value) and all(document.id for document in value):
+        return [document.id for document in value]
+    if isinstance(value, list):
+        return [compact_writes(item) for item in value]
+    return value
+
+
+def encode_choice(attribute: str, value: StrEnum | str | None) -> int | str:
+    if value is None:
+        return 0
+    if value in DESIGN_CODES[attribute]:
+        return DESIGN_CODES[attribute].index(value) + 1
+    return str(value)
+
+
+def decode_choice(attribute: str, code: int | str) -> StrEnum | str | None:
+    if isinstance(code, str):
+        return code
+    return DESIGN_CODES[attribute][code - 1] if code else None
+
+
+def is_documents(obj: Any) -> bool:
+    return isinstance(obj, list) and bool(obj) and all(isinstance(item, Document) for item in obj)
+
+
+def is_vector(obj: Any) -> bool:
+    return isinstance(obj, list) and len(obj) >= VECTOR_LENGTH and all(type(item) is float for item in obj)
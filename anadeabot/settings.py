@@ -1,12 +1,85 @@
-from typing import Optional
-from pydantic_settings import BaseSettings
+from typing import Optional, Literal
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
-    model: str = 'gpt-3.5-turbo'
+    # Fields named model_* are settings of model tiers, not pydantic internals.
+    model_config = SettingsConfigDict(protected_namespaces=('settings_',))
+
+    # The default tier, used by the agent and by every node whose output is the reply itself.
+    model: str = 'gpt-4o'
+    llm_timeout: float = 60.0
+    openai_rpm: int = 3_500
+    openai_tpm: int = 200_000
+    openai_concurrency: int = 16
+    completion_token_estimate: int = 256
+    # Nodes whose model calls yield to those of the nodes a user waits for.
+    background_nodes: list[str] = ['summarize']
+    # Models of additional tiers with their timeouts, and nodes using them instead of the default model.
+    model_tiers: dict[str, str] = {'fast': 'gpt-4o-mini'}
+    tier_timeouts: dict[str, float] = {'fast': 15.0}
+    node_tiers: dict[str, str] = {
+        'choice': 'fast', 'analysis': 'fast', 'preference': 'fast', 'support': 'fast', 'summarize': 'fast',
+    }
     embedding_model: str = 'text-embedding-3-large'
     dimensionality: int = 1024
 
+    turn_analysis: Literal['separate', 'fused'] = 'separate'
+    intent_router: bool = True
+    router_threshold: float = 0.6
+    router_margin: float = 0.05
+    choice_matcher: bool = True
+    option_catalog: bool = True
+
+    history_budget: int = 3000
+    # Tokens the history is folded down to once it outgrows the budget.
+    history_watermark: int = 1500
+
+    vector_index: bool = True
+    index_snapshot_dir: str = 'data/index'
+    index_refresh_interval: float = 60.0
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    hnsw_ef_search: int = 40
+
+    answer_cache: bool = True
+    answer_cache_threshold: float = 0.95
+    answer_cache_ttl: float = 86_400.0
+
+    llm_cache: Literal['none', 'memory', 'postgres'] = 'memory'
+    llm_cache_size: int = 10_000
+    # Nodes whose model calls are cached, with a TTL in seconds for each of them.
+    llm_cache_nodes: dict[str, float] = {'question': 3_600.0, 'decision': 86_400.0, 'format': 86_400.0}
+
+    streaming: bool = True
+    stream_edit_interval: float = 1.0
+
+    pool_min_size: int = 2
+    pool_max_size: int = 20
+    pool_timeout: float = 30.0
+    pool_max_idle: float = 600.0
+
+    user_cache_size: int = 10_000
+    embedding_cache_size: int = 10_000
+    # Seconds a vector stays in the embedding table, since every distinct message adds one.
+    embedding_cache_ttl: float = 2_592_000.0
+
+    dispatcher_workers: int = 32
+    dispatcher_queue_size: int = 500
+    dispatcher_chat_queue_size: int = 3
+    debounce_window: float = 1.5
+    debounce_max: float = 5.0
+
+    metrics_interval: float = 60.0
+
+    checkpoint_keep: int = 10
+    checkpoint_prune_batch: int = 200
+    checkpoint_prune_interval: float = 3600.0
+    checkpoint_compress_threshold: int = 1024
+
+    sync_batch_size: int = 32
+    sync_concurrency: int = 4
+
     API_ID: Optional[str] = None
     API_HASH: Optional[str] = None
     BOT_TOKEN: Optional[str] = None
@@ -7,6 +7,10 @@ from anadeabot.helpers import enum_to_list
 option_tools, get_options_tool = registry()
 
 
+def option_catalog() -> dict[str, list[str]]:
+    return {tool.name.removeprefix('get_').removesuffix('_options'): tool.invoke({}) for tool in option_tools}
+
+
 @get_options_tool
 @tool
 def get_color_options() -> list[str]:
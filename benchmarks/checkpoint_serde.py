@@ -0,0 +1,75 @@
+"""Compares the default checkpoint serializer with the compact one on a synthetic conversation.
+
+Every turn writes the channels a turn of the graph updates: the whole message list, the
+design, retrieved facts and the query embedding. Reports bytes written and serialization
+and deserialization time per turn, and the size of the metadata recording those writes.
+
+    python -m benchmarks.checkpoint_serde [turns]
+"""
+import sys
+import time
+import random
+import uuid
+
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, AIMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from anadeabot import options
+from anadeabot.schemas import DesignChoice
+from anadeabot.serde import CompactSerializer, MetadataSerializer
+
+FACT = ('To choose a printing method, consider the design: screen printing suits large orders of simple '
+        'designs, while direct to garment printing handles detailed, multicolored artwork best.')
+REPLY = ('Great choice! A black crew neck T-shirt in size M looks classic. Would you like embroidery or '
+         'screen printing for your design? Embroidery gives a premium feel, while screen printing is more vivid.')
+
+
+def conversation(turns: int) -> tuple[list[dict], dict[str, Document]]:
+    facts = [Document(FACT, id=str(uuid.uuid4())) for _ in range(30)]
+    messages, states = [], []
+    for turn in range(turns):
+        messages = [*messages, HumanMessage(f'I would like a black t-shirt, turn {turn}', id=str(uuid.uuid4())),
+                    AIMessage(REPLY, id=str(uuid.uuid4()))]
+        states.append({
+            'messages': messages,
+            'design': DesignChoice(color=options.TShirtColor.BLACK, size=options.TShirtSize.M,
+                                   style=options.TShirtStyle.CREW_NECK),
+            'facts': random.sample(facts, 5),
+            'query': [random.uniform(-1, 1) for _ in range(1024)],
+        })
+    return states, {fact.id: fact for fact in facts}
+
+
+def measure(serde, states: list[dict]) -> tuple[int, float, float]:
+    written, dumping, loading = 0, 0.0, 0.0
+    for state in states:
+        for value in state.values():
+            started = time.perf_counter()
+            blob = serde.dumps_typed(value)
+            dumped = time.perf_counter()
+            serde.loads_typed(blob)
+            dumping += dumped - started
+            loading += time.perf_counter() - dumped
+            written += len(blob[1])
+    return written, dumping, loading
+
+
+def metadata(serde, states: list[dict]) -> int:
+    return sum(len(serde.dumps_typed({'source': 'loop', 'writes': {'turn': state}})[1]) for state in states)
+
+
+def main(turns: int):
+    states, documents = conversation(turns)
+    for name, serde in [('default', JsonPlusSerializer()),
+                        ('compact', CompactSerializer(documents.get, threshold=0)),
+                        ('compact+zlib', CompactSerializer(documents.get, threshold=1024))]:
+        written, dumping, loading = measure(serde, states)
+        print(f'{name:<13} {written / turns / 1024:8.1f} KiB/turn  '
+              f'dumps {dumping / turns * 1000:6.2f}ms/turn  loads {loading / turns * 1000:6.2f}ms/turn')
+    for name, serde in [('metadata', JsonPlusSerializer()), ('compact', MetadataSerializer())]:
+        print(f'{name:<13} {metadata(serde, states) / turns / 1024:8.1f} KiB/turn')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
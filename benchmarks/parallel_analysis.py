@@ -0,0 +1,90 @@
+"""Compares sequential and parallel choice extraction and grounding retrieval.
+
+Runs the first step of the graph on sample messages against the configured OpenAI
+and Postgres, once with the nodes chained and once fanned out from START. Messages the
+choice matcher resolves skip the LLM call, so the two paths are reported separately.
+
+    python -m benchmarks.parallel_analysis [rounds]
+"""
+import sys
+import time
+import asyncio
+import statistics
+
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+from langgraph.graph import StateGraph, START, END
+
+from anadeabot import database
+from anadeabot.matcher import matcher
+from anadeabot.settings import settings
+from anadeabot.graph import State, ConfigSchema, choice_node, grounding_node
+
+MESSAGES = {
+    'matcher': [
+        'Hi there!',
+        'I would like a black t-shirt in size M',
+        'What materials are the t-shirts made from?',
+    ],
+    'llm': [
+        'Can I get a v-neck with embroidery?',
+        'How long does delivery take?',
+        "I'd like a large logo on a black shirt",
+        'Not red, something else',
+        'White, the rest is up to you',
+    ],
+}
+
+
+def build(parallel: bool):
+    graph_builder = StateGraph(State, config_schema=ConfigSchema)
+    graph_builder.add_node('choice', choice_node)
+    graph_builder.add_node('grounding', grounding_node)
+    if parallel:
+        graph_builder.add_edge(START, 'choice')
+        graph_builder.add_edge(START, 'grounding')
+        graph_builder.add_edge(['choice', 'grounding'], END)
+    else:
+        graph_builder.add_edge(START, 'choice')
+        graph_builder.add_edge('choice', 'grounding')
+        graph_builder.add_edge('grounding', END)
+    return graph_builder.compile()
+
+
+async def measure(graph, llm, messages: list[str], rounds: int) -> list[float]:
+    timings = []
+    for _ in range(rounds):
+        for text in messages:
+            started = time.perf_counter()
+            await graph.ainvoke({'messages': [HumanMessage(text)]}, config={'configurable': {'llm': llm}})
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summary(timings: list[float]) -> str:
+    p50 = statistics.median(timings) * 1000
+    p95 = statistics.quantiles(timings, n=20)[-1] * 1000
+    return f'p50={p50:.0f}ms p95={p95:.0f}ms mean={statistics.mean(timings) * 1000:.0f}ms'
+
+
+async def main(rounds: int):
+    for path, messages in MESSAGES.items():
+        for text in messages:
+            if settings.choice_matcher and (matcher.extract(text) is None) != (path == 'llm'):
+                raise ValueError(f'{text!r} does not take the {path} path')
+    llm = ChatOpenAI(model=settings.model, api_key=settings.OPENAI_API_KEY, temperature=0.1)
+    async with database.pool:
+        await database.prepare_vectorstores()
+        # Warm up connections and the collection lookup before measuring.
+        await measure(build(parallel=True), llm, MESSAGES['llm'], 1)
+        for path, messages in MESSAGES.items():
+            sequential = await measure(build(parallel=False), llm, messages, rounds)
+            parallel = await measure(build(parallel=True), llm, messages, rounds)
+            print(f'{path}')
+            print(f'  sequential: {summary(sequential)}')
+            print(f'  parallel:   {summary(parallel)}')
+            print(f'  saved:      {(statistics.median(sequential) - statistics.median(parallel)) * 1000:.0f}ms at p50')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
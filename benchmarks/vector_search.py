@@ -0,0 +1,95 @@
+"""Measures similarity search latency with and without the HNSW index of a collection.
+
+Seeds synthetic unit vectors into a scratch copy of the embedding table, split between
+the searched collection and another one of the same size, and grows it through the
+given sizes. At each size the partial index is rebuilt and random queries are timed
+with the index and with a sequential scan.
+
+    python -m benchmarks.vector_search [sizes] [dimensions] [queries]
+
+Sizes are comma separated, 10000,100000,1000000 by default.
+"""
+import sys
+import time
+import uuid
+import asyncio
+import statistics
+
+import numpy as np
+
+from anadeabot import database
+from anadeabot.settings import settings
+
+TABLE = 'benchmark_embedding'
+COLLECTION = uuid.uuid4()
+OTHER = uuid.uuid4()
+
+SEARCH = f"""
+    SELECT id FROM {TABLE} WHERE collection_id = %s
+    ORDER BY embedding <=> %s::vector LIMIT 5
+"""
+
+
+async def seed(connection, start: int, stop: int, dimensions: int) -> None:
+    # Vectors are generated in the database, the row number keeps the subquery correlated.
+    for collection_id in (COLLECTION, OTHER):
+        await connection.execute(f"""
+            INSERT INTO {TABLE} (collection_id, embedding)
+            SELECT %s, (SELECT array_agg(random() - 0.5 + i * 0) FROM generate_series(1, %s))::vector
+            FROM generate_series(%s, %s - 1) AS i
+        """, (collection_id, dimensions, start, stop))
+
+
+async def measure(connection, dimensions: int, queries: int, indexed: bool) -> list[float]:
+    await connection.execute(f'SET enable_indexscan = {"on" if indexed else "off"}')
+    timings = []
+    for _ in range(queries):
+        vector = np.random.default_rng().standard_normal(dimensions)
+        started = time.perf_counter()
+        # Unnamed statements are planned with the collection id, which the partial index needs.
+        await connection.execute(SEARCH, (COLLECTION, str((vector / np.linalg.norm(vector)).tolist())),
+                                 prepare=False)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summary(timings: list[float]) -> str:
+    p50 = statistics.median(timings) * 1000
+    p99 = statistics.quantiles(timings, n=100)[-1] * 1000
+    return f'p50={p50:.1f}ms p99={p99:.1f}ms'
+
+
+async def main(sizes: list[int], dimensions: int, queries: int):
+    create, drop = database.vector_index_ddl('benchmark', COLLECTION, table=TABLE)
+    async with database.pool, database.pool.connection() as connection:
+        await connection.execute(f"""
+            CREATE TABLE {TABLE} (
+                id bigserial PRIMARY KEY, collection_id uuid NOT NULL, embedding vector({dimensions})
+            )
+        """)
+        try:
+            seeded = 0
+            for size in sizes:
+                # Rows are inserted without the index and it is built from scratch, which is faster.
+                await connection.execute(drop)
+                await seed(connection, seeded, size, dimensions)
+                seeded = size
+                started = time.perf_counter()
+                await connection.execute(create)
+                built = time.perf_counter() - started
+                await connection.execute(f'ANALYZE {TABLE}')
+                # Exact search is slow at large sizes, a tenth of the queries is enough to compare.
+                exact = await measure(connection, dimensions, max(queries // 10, 2), indexed=False)
+                hnsw = await measure(connection, dimensions, queries, indexed=True)
+                print(f'{size:>9} rows  index built in {built:.1f}s  '
+                      f'hnsw (ef_search={settings.hnsw_ef_search}): {summary(hnsw)}  exact: {summary(exact)}')
+        finally:
+            await connection.execute(f'DROP TABLE {TABLE}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(
+        [int(size) for size in sys.argv[1].split(',')] if len(sys.argv) > 1 else [10_000, 100_000, 1_000_000],
+        int(sys.argv[2]) if len(sys.argv) > 2 else settings.dimensionality,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 200,
+    ))
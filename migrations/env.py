@@ -66,8 +66,10 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # Data migrations write through the application's own connections, which only see
+        # the extension and tables of earlier migrations once those are committed.
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, transaction_per_migration=True
         )
 
         with context.begin_transaction():
@@ -1,14 +1,14 @@
 from typing import Sequence, Union
-import csv
+import asyncio
 
 from alembic import op
 import sqlalchemy as sa
 
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from langchain_openai.chat_models import ChatOpenAI
 
 from anadeabot import database
+from anadeabot import knowledge
+from anadeabot.governor import http_client
 from anadeabot.settings import settings
 
 # revision identifiers, used by Alembic.
@@ -17,27 +17,17 @@ down_revision: Union[str, None] = '4ae9e5a27fc6'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
-grounding_prompt = PromptTemplate.from_template("""
-    Given a question and its answer, COMPOSE them together into a single piece
-    of knowledge, something like: "to do this, you have to do this" or "it works
-    in this way" or just as a fact and REPHRASE the piece of knowledge to be
-    complete and self-contained.\n\nQuestion:\n{question}\n\nAnswer:\n{answer} 
-""")
 
+async def populate() -> None:
+    # The initial load is the same incremental sync as `python -m anadeabot.cli sync-knowledge`,
+    # which also creates the tables and collections of the vector stores on a fresh database.
+    llm = ChatOpenAI(model=settings.model, api_key=settings.OPENAI_API_KEY, http_async_client=http_client())
+    async with database.pool:
+        await knowledge.sync('data/qa.csv', llm, batch=settings.sync_batch_size, concurrency=settings.sync_concurrency)
 
-def upgrade() -> None:
-    llm = ChatOpenAI(model=settings.model, api_key=settings.OPENAI_API_KEY)
-    chain = (grounding_prompt | llm | StrOutputParser())
-
-    with open('data/qa.csv', newline='') as file:
-        questions_answers = list(csv.DictReader(file))
 
-    database.create_faq(questions_answers)
-
-    facts = chain.batch([
-        {'question': qa['question'], 'answer': qa['answer']} for qa in questions_answers
-    ])
-    database.add_facts(facts)
+def upgrade() -> None:
+    asyncio.run(populate())
 
 
 def downgrade() -> None:
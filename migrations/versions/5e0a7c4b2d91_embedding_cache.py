@@ -0,0 +1,27 @@
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e0a7c4b2d91'
+down_revision: Union[str, None] = '9b2e6f1d7c3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('embedding',
+    sa.Column('emb_model', sa.String(), nullable=False),
+    sa.Column('emb_dimensionality', sa.Integer(), nullable=False),
+    sa.Column('emb_text_hash', sa.LargeBinary(), nullable=False),
+    sa.Column('emb_vector', Vector(), nullable=False),
+    sa.Column('emb_created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.PrimaryKeyConstraint('emb_model', 'emb_dimensionality', 'emb_text_hash')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('embedding')
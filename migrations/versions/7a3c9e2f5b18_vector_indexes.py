@@ -0,0 +1,30 @@
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from anadeabot.database import vector_index_ddl
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3c9e2f5b18'
+down_revision: Union[str, None] = '5e0a7c4b2d91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def collections() -> list[tuple]:
+    return op.get_bind().execute(sa.text('SELECT name, uuid FROM langchain_pg_collection')).all()
+
+
+def upgrade() -> None:
+    # One partial index per collection, so a search never walks the graph of another collection.
+    # Collections created later need the same statement from vector_index_ddl.
+    for name, collection_id in collections():
+        create, _ = vector_index_ddl(name, collection_id)
+        op.execute(create)
+
+
+def downgrade() -> None:
+    for name, collection_id in collections():
+        _, drop = vector_index_ddl(name, collection_id)
+        op.execute(drop)
@@ -0,0 +1,20 @@
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2e6f1d7c3a'
+down_revision: Union[str, None] = '4d3f81bcfcc1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Get-or-create relies on ON CONFLICT (user_telegram_id), which needs a unique index.
+    op.create_index('ix_user_user_telegram_id', 'user', ['user_telegram_id'], unique=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    # The index is also declared by the initial revision and checkpoint foreign keys depend on it.
+    pass
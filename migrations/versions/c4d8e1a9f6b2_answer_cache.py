@@ -0,0 +1,30 @@
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e1a9f6b2'
+down_revision: Union[str, None] = '7a3c9e2f5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('answer',
+    sa.Column('ans_id', sa.Uuid(), nullable=False),
+    sa.Column('ans_question', sa.Text(), nullable=False),
+    sa.Column('ans_vector', Vector(), nullable=False),
+    sa.Column('ans_answer', sa.Text(), nullable=False),
+    sa.Column('ans_knowledge', sa.String(), nullable=False),
+    sa.Column('ans_created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.PrimaryKeyConstraint('ans_id')
+    )
+    op.create_index('ix_answer_ans_knowledge', 'answer', ['ans_knowledge'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_answer_ans_knowledge', table_name='answer')
+    op.drop_table('answer')
@@ -0,0 +1,27 @@
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7d5c3a841'
+down_revision: Union[str, None] = 'c4d8e1a9f6b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('generation',
+    sa.Column('gen_key', sa.LargeBinary(), nullable=False),
+    sa.Column('gen_node', sa.String(), nullable=False),
+    sa.Column('gen_value', sa.Text(), nullable=False),
+    sa.Column('gen_expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('gen_key')
+    )
+    op.create_index('ix_generation_gen_expires_at', 'generation', ['gen_expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_generation_gen_expires_at', table_name='generation')
+    op.drop_table('generation')
@@ -0,0 +1,5 @@
+import os
+
+# Settings require these, nothing in the tests connects to either service.
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ.setdefault('POSTGRES_URI', 'postgresql://test@localhost/test')
@@ -0,0 +1,25 @@
+import asyncio
+
+from langchain_postgres import PGVector
+from langchain_postgres.vectorstores import _get_embedding_collection_store
+
+from anadeabot import database
+from anadeabot.index import faq_index, grounding_index
+from anadeabot.settings import settings
+
+
+async def nothing(*args, **kwargs) -> None:
+    return None
+
+
+def test_indexes_query_prepared_vectorstores(monkeypatch):
+    _, collection = _get_embedding_collection_store(settings.dimensionality)
+    monkeypatch.setattr(PGVector, 'acreate_vector_extension', nothing)
+    monkeypatch.setattr(PGVector, 'acreate_tables_if_not_exists', nothing)
+    monkeypatch.setattr(collection, 'aget_or_create', classmethod(nothing))
+
+    asyncio.run(database.prepare_vectorstores())
+
+    for index in [faq_index, grounding_index]:
+        store = index.vectorstore.EmbeddingStore
+        assert index.select(store.id).compile() is not None
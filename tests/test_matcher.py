@@ -0,0 +1,59 @@
+import pytest
+
+from anadeabot.matcher import ChoiceMatcher, ALIASES, QUALIFIED, GENDERED, CHOICE_CUES, DELEGATION_CUES
+from anadeabot.options import TShirtColor, TShirtSize, TShirtStyle, TShirtGender, TShirtPrintingOptions
+from anadeabot.schemas import DesignChoice
+
+
+@pytest.fixture
+def matcher() -> ChoiceMatcher:
+    return ChoiceMatcher(ALIASES, QUALIFIED, GENDERED, CHOICE_CUES, DELEGATION_CUES)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Black, size L', DesignChoice(color=TShirtColor.BLACK, size=TShirtSize.L)),
+    ('I want a large shirt in white', DesignChoice(color=TShirtColor.WHITE, size=TShirtSize.L)),
+    ('Medium, blue please', DesignChoice(color=TShirtColor.BLUE, size=TShirtSize.M)),
+    ('size small', DesignChoice(size=TShirtSize.S)),
+    ('A tank top with embroidery', DesignChoice(style=TShirtStyle.TANK_TOP,
+                                                printing=TShirtPrintingOptions.EMBROIDERY)),
+    ('M', DesignChoice(size=TShirtSize.M)),
+    ('A shirt for men, size XL', DesignChoice(size=TShirtSize.XL, gender=TShirtGender.MALE)),
+    ("Women's fit in green", DesignChoice(color=TShirtColor.GREEN, gender=TShirtGender.FEMALE)),
+    ('Unisex', DesignChoice(gender=TShirtGender.UNISEX)),
+])
+def test_extract_literal_choices(matcher, text, expected):
+    assert matcher.extract(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    "I'd like a large logo on a black shirt",
+    'Put a small print on the back, white please',
+    'Not red, something else',
+    'Black or white?',
+    'White, the rest is up to you',
+    'Can I get it in navy?',
+])
+def test_extract_defers_to_llm(matcher, text):
+    assert matcher.extract(text) is None
+
+
+@pytest.mark.parametrize('text', [
+    'Tank you for the help', 'Hello there', 'My crew will love it', 'Thanks man!', 'hey man what sizes do you have',
+    'My wife is a busy woman', 'Hello ladies',
+])
+def test_extract_without_choices(matcher, text):
+    assert matcher.extract(text) == DesignChoice()
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Yes', True),
+    ('Go ahead, please', True),
+    ('Sounds good!', True),
+    ('No', False),
+    ('Cancel the order', False),
+    ('Yes, but make it blue', None),
+    ('What about delivery?', None),
+])
+def test_confirm(matcher, text, expected):
+    assert matcher.confirm(text) is expected